@@ -1,9 +1,18 @@
 from flask import Flask, jsonify
 from werkzeug.exceptions import HTTPException
-from config import Config
+from werkzeug.middleware.proxy_fix import ProxyFix
+from config import Config, validate_config
 from models import db
 from auth import auth_bp
 from routes import api_bp
+from replicas import replica_router
+from sharding import shard_router
+from serializers import FastJSONProvider
+from discounts import discount_engine
+from ratelimit import limiter
+from singleflight import read_cache
+from seatmap import seat_maps
+from invalidation import invalidation_bus
 import logging
 
 logging.basicConfig(
@@ -15,8 +24,19 @@ logger = logging.getLogger(__name__)
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
+    validate_config(app.config)
+    app.json = FastJSONProvider(app)
+    if app.config['TRUSTED_PROXY_COUNT']:
+        app.wsgi_app = ProxyFix(app.wsgi_app, x_for=app.config['TRUSTED_PROXY_COUNT'])
     
     db.init_app(app)
+    replica_router.init_app(app)
+    shard_router.init_app(app)
+    discount_engine.init_app(app)
+    limiter.init_app(app)
+    read_cache.init_app(app)
+    seat_maps.init_app(app)
+    invalidation_bus.init_app(app)
     
     app.register_blueprint(auth_bp, url_prefix='/auth')
     app.register_blueprint(api_bp, url_prefix='/api')
@@ -0,0 +1,153 @@
+import logging
+import sys
+from datetime import datetime, timedelta
+
+from sqlalchemy import Column, Index, Table, select, union_all, exists
+
+from models import db, Match, Ticket, Booking, Payment
+from invalidation import invalidate_match, drop_seat_map
+from sharding import shard_router
+
+logger = logging.getLogger(__name__)
+
+
+def _archive_table(table, *indexes):
+    # Same columns in the same order as the live table so the two can be
+    # UNION ALL'd, but without foreign keys so rows can outlive their parents.
+    columns = [Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in table.columns]
+    return Table(f'archived_{table.name}', db.metadata, *columns, *indexes)
+
+
+archived_matches = _archive_table(Match.__table__, Index('ix_archived_matches_match_date', 'match_date'))
+archived_tickets = _archive_table(
+    Ticket.__table__,
+    Index('ix_archived_tickets_match_id', 'match_id'),
+    Index('ix_archived_tickets_booking_id', 'booking_id'),
+)
+archived_bookings = _archive_table(Booking.__table__, Index('ix_archived_bookings_user_id', 'user_id'))
+archived_payments = _archive_table(Payment.__table__, Index('ix_archived_payments_booking_id', 'booking_id'))
+
+ARCHIVE_TABLES = [archived_matches, archived_tickets, archived_bookings, archived_payments]
+
+_ARCHIVES = {
+    'matches': (Match.__table__, archived_matches),
+    'tickets': (Ticket.__table__, archived_tickets),
+    'bookings': (Booking.__table__, archived_bookings),
+    'payments': (Payment.__table__, archived_payments),
+}
+
+
+def live_and_archived(name, alias=None):
+    """Live and archived rows of the ``name`` table as one selectable"""
+    live, archived = _ARCHIVES[name]
+    return union_all(select(live), select(archived)).subquery(alias or live.name)
+
+
+def reporting_tables(include_archived=False):
+    """``(matches, tickets, bookings)`` selectables for reports, optionally
+    spanning live and archived rows"""
+    if not include_archived:
+        return Match.__table__, Ticket.__table__, Booking.__table__
+    return tuple(live_and_archived(name) for name in ('matches', 'tickets', 'bookings'))
+
+
+def _move(conn, name, ids):
+    live, archived = _ARCHIVES[name]
+    conn.execute(archived.insert().from_select(
+        [c.name for c in live.columns], select(live).where(live.c.id.in_(ids))
+    ))
+    conn.execute(live.delete().where(live.c.id.in_(ids)))
+
+
+class MatchArchiver:
+    """Moves matches played before a cutoff, with their tickets and the
+    bookings and payments that only cover those tickets, into the
+    ``archived_*`` tables.
+
+    Work is split into transactions of at most ``batch_size`` rows, so the
+    live tables are never locked for long. A booking is only moved once none
+    of its tickets remain live, which keeps bulk bookings spanning several
+    matches intact until every match is archived.
+    """
+
+    def __init__(self, engine, batch_size=1000):
+        self.engine = engine
+        self.batch_size = batch_size
+
+    def completed_matches(self, before):
+        matches = Match.__table__
+        with self.engine.connect() as conn:
+            return list(conn.execute(
+                select(matches.c.id).where(matches.c.match_date < before).order_by(matches.c.match_date)
+            ).scalars())
+
+    def archive_match(self, match_id):
+        if shard_router.enabled:
+            # Tickets would have to move from a shard to the primary, which
+            # cannot be done in one transaction.
+            raise RuntimeError("Archiving matches with sharded seat inventory is not supported")
+        tickets = Ticket.__table__
+        bookings = Booking.__table__
+        payments = Payment.__table__
+        moved = {'tickets': 0, 'bookings': 0, 'payments': 0}
+
+        while True:
+            with self.engine.begin() as conn:
+                ids = list(conn.execute(
+                    select(tickets.c.id).where(tickets.c.match_id == match_id).limit(self.batch_size)
+                ).scalars())
+                if not ids:
+                    break
+                _move(conn, 'tickets', ids)
+                moved['tickets'] += len(ids)
+
+        still_live = exists().where(tickets.c.booking_id == bookings.c.id)
+        orphaned = select(bookings.c.id).where(
+            bookings.c.id.in_(
+                select(archived_tickets.c.booking_id).where(
+                    archived_tickets.c.match_id == match_id, archived_tickets.c.booking_id.is_not(None)
+                )
+            ),
+            ~still_live
+        ).limit(self.batch_size)
+
+        while True:
+            with self.engine.begin() as conn:
+                booking_ids = list(conn.execute(orphaned).scalars())
+                if not booking_ids:
+                    break
+                payment_ids = list(conn.execute(
+                    select(payments.c.id).where(payments.c.booking_id.in_(booking_ids))
+                ).scalars())
+                if payment_ids:
+                    _move(conn, 'payments', payment_ids)
+                _move(conn, 'bookings', booking_ids)
+                moved['bookings'] += len(booking_ids)
+                moved['payments'] += len(payment_ids)
+
+        with self.engine.begin() as conn:
+            _move(conn, 'matches', [match_id])
+
+        logger.info(f"Archived match {match_id}: {moved}")
+        return moved
+
+    def run(self, before):
+        totals = {'matches': 0, 'tickets': 0, 'bookings': 0, 'payments': 0}
+        for match_id in self.completed_matches(before):
+            moved = self.archive_match(match_id)
+            invalidate_match(match_id)
+            drop_seat_map(match_id)
+            totals['matches'] += 1
+            for key, count in moved.items():
+                totals[key] += count
+        return totals
+
+
+if __name__ == '__main__':
+    from app import create_app
+
+    days = int(sys.argv[1]) if len(sys.argv) > 1 else 1
+    app = create_app()
+    with app.app_context():
+        archiver = MatchArchiver(db.engine, batch_size=app.config['ARCHIVE_BATCH_SIZE'])
+        print(archiver.run(datetime.utcnow() - timedelta(days=days)))
@@ -2,14 +2,15 @@ from flask import Blueprint, request, jsonify
 from models import db, User
 from functools import wraps
 from werkzeug.security import generate_password_hash, check_password_hash
-import jwt
 from config import Config
+from ratelimit import limiter
 from datetime import datetime, timedelta
 import re
 
 auth_bp = Blueprint('auth', __name__)
 
 def create_token(user_id):
+    import jwt
     payload = {
         'user_id': user_id,
         'exp': datetime.utcnow() + timedelta(days=1)
@@ -19,6 +20,7 @@ def create_token(user_id):
 def token_required(f):
     @wraps(f)
     def decorated(*args, **kwargs):
+        import jwt
         token = request.headers.get('Authorization')
         if not token:
             return jsonify({'error': 'Token is missing'}), 401
@@ -80,6 +82,7 @@ def register():
     }), 201
 
 @auth_bp.route('/login', methods=['POST'])
+@limiter.limit('login')
 def login():
     data = request.get_json()
     
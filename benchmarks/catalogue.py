@@ -0,0 +1,194 @@
+"""Compare the Flask blueprint with the async catalogue app on the browse
+endpoints, each served by a single process on a seeded SQLite file.
+
+The blueprint is served one request at a time, as by a gunicorn sync worker
+(the default in gunicorn.conf.py), and by werkzeug's thread-per-request
+server; the catalogue runs on uvicorn. Many concurrent browsers fetch a mix
+of match lists, match details, ticket pages and searches with the read
+caches off, so every request reaches the database. Local SQLite answers in
+microseconds, which leaves only Python overhead to compare; each run is
+repeated with every statement delayed in the driver's thread, standing in
+for a database across the network.
+
+Needs starlette, uvicorn and aiosqlite.
+Run from the repository root: python -m benchmarks.catalogue
+"""
+import asyncio
+import os
+import random
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+
+MATCHES = 50
+SEATS = 2000
+CONCURRENCY = (100, 1000)
+DURATION = 5.0
+LATENCIES = (0, 0.01)
+
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('PAYMENT_API_KEY', 'bench')
+os.environ.setdefault('PAYMENT_SECRET', 'bench')
+
+# Both servers delay statements in the thread that runs them: a request
+# thread for the blueprint, aiosqlite's connection thread for the catalogue.
+SERVER = r'''
+import sqlite3, sqlite3.dbapi2, sys, time
+latency = float(sys.argv[3])
+
+class SlowCursor(sqlite3.Cursor):
+    def execute(self, *args):
+        time.sleep(latency)
+        return super().execute(*args)
+
+class SlowConnection(sqlite3.Connection):
+    def cursor(self, factory=SlowCursor):
+        return super().cursor(factory)
+
+connect = sqlite3.connect
+sqlite3.connect = sqlite3.dbapi2.connect = lambda *args, **kwargs: connect(*args, factory=SlowConnection, **kwargs)
+
+port = int(sys.argv[2])
+if sys.argv[1] == 'catalogue':
+    import uvicorn
+    uvicorn.run('catalogue:app', port=port, log_level='warning')
+else:
+    from werkzeug.serving import make_server
+    from app import create_app
+    make_server('127.0.0.1', port, create_app(), threaded=sys.argv[1] == 'threaded').serve_forever()
+'''
+
+
+def seed(path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    from datetime import datetime, timedelta
+    from app import create_app
+    from models import db, Match, Ticket
+    from migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        upgrade(db.engine)
+        for i in range(MATCHES):
+            match = Match(home_team=f'Home {i}', away_team=f'Away {i}', venue='Ground', total_seats=SEATS,
+                          match_date=datetime.now() + timedelta(days=i + 1), ticket_price=50)
+            db.session.add(match)
+            db.session.flush()
+            db.session.add_all(
+                Ticket(match_id=match.id, seat_number=f'S{n:04d}', section=('North', 'South')[n % 2],
+                       price=50, is_available=n % 3 != 0)
+                for n in range(SEATS)
+            )
+        db.session.commit()
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def paths():
+    rng = random.Random(1)
+    while True:
+        match_id = rng.randint(1, MATCHES)
+        yield rng.choice((
+            f'/api/matches?page={rng.randint(1, 3)}',
+            f'/api/matches/{match_id}',
+            f'/api/matches/{match_id}/tickets?page={rng.randint(1, 10)}',
+            f'/api/matches/search?q=Home+{rng.randint(0, MATCHES - 1)}',
+        ))
+
+
+async def fetch(port, connection, path):
+    """One keep-alive GET; returns the status and the connection to reuse"""
+    if connection is None:
+        connection = await asyncio.open_connection('127.0.0.1', port)
+    reader, writer = connection
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: bench\r\n\r\n'.encode())
+    head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+    headers = dict(line.lower().split(': ', 1) for line in head[1:] if line)
+    await reader.readexactly(int(headers['content-length']))
+    if head[0].startswith('HTTP/1.0') or headers.get('connection') == 'close':
+        writer.close()
+        connection = None
+    return int(head[0].split()[1]), connection
+
+
+async def load(port, concurrency, duration=DURATION):
+    latencies, errors = [], 0
+    urls = paths()
+    deadline = time.perf_counter() + duration
+
+    async def browser():
+        nonlocal errors
+        connection = None
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                status, connection = await asyncio.wait_for(fetch(port, connection, next(urls)), 30)
+            except (OSError, ValueError, KeyError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                errors += 1
+                if connection is not None:
+                    connection[1].close()
+                connection = None
+                continue
+            if status != 200:
+                errors += 1
+            latencies.append(time.perf_counter() - started)
+        if connection is not None:
+            connection[1].close()
+
+    started = time.perf_counter()
+    await asyncio.gather(*(browser() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+    latencies.sort()
+    return {
+        'rps': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000 if latencies else 0,
+        'p99_ms': latencies[int(len(latencies) * 0.99)] * 1000 if latencies else 0,
+        'errors': errors,
+    }
+
+
+def wait_for(port, process, timeout=20):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"Server exited with {process.returncode}")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.2).close()
+            return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError("Server did not start")
+
+
+def serve_and_measure(server, latency, env):
+    port = free_port()
+    process = subprocess.Popen([sys.executable, '-c', SERVER, server, str(port), str(latency)], env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        wait_for(port, process)
+        asyncio.run(load(port, 10, duration=1.0))
+        return [asyncio.run(load(port, concurrency)) for concurrency in CONCURRENCY]
+    finally:
+        process.terminate()
+        process.wait()
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        seed(os.path.join(tmp, 'bench.db'))
+        env = {**os.environ, 'PYTHONPATH': os.getcwd(), 'READ_CACHE_TTL': '0', 'RATELIMIT_ENABLED': 'false',
+               'CATALOGUE_POOL_SIZE': os.environ.get('CATALOGUE_POOL_SIZE', '50'), 'CATALOGUE_MAX_OVERFLOW': '0'}
+        print(f"{MATCHES} matches x {SEATS} seats, {DURATION:.0f}s per run, one server process each")
+        for latency in LATENCIES:
+            print(f"statement latency {latency * 1000:.0f}ms")
+            for server in ('sync', 'threaded', 'catalogue'):
+                for concurrency, result in zip(CONCURRENCY, serve_and_measure(server, latency, env)):
+                    print(f"  {server:>9} {concurrency:4d} browsers: {result['rps']:7.1f} req/s  "
+                          f"p50 {result['p50_ms']:7.1f}ms  p99 {result['p99_ms']:7.1f}ms  errors {result['errors']}")
@@ -0,0 +1,60 @@
+"""Compare the legacy per-route dict building + stdlib json against the
+precompiled serializers, projection rows + FastJSONProvider, as the routes
+serve them.
+
+Run from the repository root: python -m benchmarks.serialization
+"""
+import json
+import os
+import timeit
+from datetime import datetime
+from decimal import Decimal
+
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('DATABASE_PASSWORD', 'bench')
+os.environ.setdefault('PAYMENT_API_KEY', 'bench')
+os.environ.setdefault('PAYMENT_SECRET', 'bench')
+
+from flask import Flask
+from models import Match, Ticket, Booking, BookingStatus
+from projections import BookingHistoryRow
+from serializers import FastJSONProvider, orjson, serialize_ticket, serialize_match
+
+ROWS = 100
+ROUNDS = 200
+
+tickets = [Ticket(id=i, seat_number=f"S{i:03d}", section='Standard', price=Decimal('89.99')) for i in range(ROWS)]
+matches = [Match(id=i, home_team='Home', away_team='Away', venue='Ground',
+                 match_date=datetime(2024, 5, 1, 15), ticket_price=Decimal('59.99')) for i in range(ROWS)]
+bookings = [Booking(id=i, total_amount=Decimal('103.49'), status=BookingStatus.CONFIRMED) for i in range(ROWS)]
+history = [BookingHistoryRow(i, 'Home vs Away', f"S{i:03d}", 'Standard', Decimal('103.49'), 'confirmed')
+           for i in range(ROWS)]
+
+app = Flask(__name__)
+provider = FastJSONProvider(app)
+
+
+def legacy():
+    json.dumps({
+        'tickets': [{'id': t.id, 'seat_number': t.seat_number, 'section': t.section, 'price': float(t.price)} for t in tickets],
+        'matches': [{'id': m.id, 'home_team': m.home_team, 'away_team': m.away_team, 'venue': m.venue,
+                     'match_date': m.match_date.isoformat(), 'ticket_price': float(m.ticket_price)} for m in matches],
+        'bookings': [{'booking_id': b.id, 'match': 'Home vs Away', 'seat': f"S{b.id:03d}", 'section': 'Standard',
+                      'amount': float(b.total_amount),
+                      'status': b.status.value if hasattr(b.status, 'value') else str(b.status)} for b in bookings],
+    }, sort_keys=True, separators=(',', ':'))
+
+
+def compiled():
+    provider.dumps({
+        'tickets': [serialize_ticket(t) for t in tickets],
+        'matches': [serialize_match(m) for m in matches],
+        'bookings': [row.to_dict() for row in history],
+    }, separators=(',', ':'))
+
+
+if __name__ == '__main__':
+    print(f"encoder: {'orjson' if orjson else 'stdlib json'}; {ROWS} rows per model, {ROUNDS} rounds")
+    for name, fn in (('legacy', legacy), ('compiled', compiled)):
+        best = min(timeit.repeat(fn, number=ROUNDS, repeat=5))
+        print(f"{name:>9}: {best / ROUNDS * 1e6:8.1f} us/response  {ROUNDS / best:8.0f} responses/s")
@@ -0,0 +1,141 @@
+"""Local demonstration of seat inventory sharding with SQLite files.
+
+A "marquee" match keeps its seat inventory write-locked half of the time
+while other threads book seats for the remaining matches. With one database
+every booking queues behind the marquee; with the marquee pinned to its own
+shard the other bookings only share the primary. The cross-shard attendance
+report is timed as well.
+
+Run from the repository root: python -m benchmarks.sharding
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+
+MATCHES = 5
+SEATS = 200
+BOOKERS = 4
+BOOKINGS_PER_BOOKER = 40
+HOLD_SECONDS = 0.02
+SHARDS = 3
+
+
+def environment(tmp, sharded):
+    env = {
+        'SECRET_KEY': 'bench', 'PAYMENT_API_KEY': 'bench', 'PAYMENT_SECRET': 'bench',
+        'RATELIMIT_ENABLED': 'false',
+        'DATABASE_URL': f'sqlite:///{tmp}/primary.db',
+    }
+    if sharded:
+        env['SHARD_URLS'] = ','.join(f'sqlite:///{tmp}/shard_{i}.db' for i in range(SHARDS))
+        # The marquee gets shard_0 to itself; everything else shares the rest.
+        env['SHARD_PINS'] = ','.join(
+            f'{match_id}=shard_{0 if match_id == 1 else 1 + match_id % (SHARDS - 1)}'
+            for match_id in range(1, MATCHES + 1)
+        )
+    return env
+
+
+def run(mode):
+    from datetime import datetime, timedelta
+    from sqlalchemy import select, text
+    from app import create_app
+    from auth import create_token
+    from models import db, User, Match, Ticket
+    from migrations import upgrade, upgrade_shards
+    from sharding import shard_router
+
+    app = create_app()
+    with app.app_context():
+        upgrade(db.engine)
+        upgrade_shards(shard_router, db.engines)
+        user = User(username='bench', email='bench@example.com', password='x')
+        db.session.add(user)
+        for i in range(MATCHES):
+            db.session.add(Match(home_team=f'Home {i}', away_team=f'Away {i}', venue='Ground', total_seats=SEATS,
+                                 match_date=datetime.now() + timedelta(days=i + 1), ticket_price=50))
+        db.session.commit()
+        for match_id in range(1, MATCHES + 1):
+            db.session.add_all(Ticket(match_id=match_id, seat_number=f'S{n:04d}', section='Main', price=50,
+                                      is_available=True) for n in range(SEATS))
+        db.session.commit()
+        token = create_token(user.id)
+        marquee_engine = db.engines[shard_router.shard_for_match(1)] if shard_router.enabled else db.engine
+        seats = {
+            match_id: [t.id for t in shard_router.scatter(
+                select(Ticket.id).where(Ticket.match_id == match_id).order_by(Ticket.id)
+            )]
+            for match_id in range(2, MATCHES + 1)
+        }
+
+    stop = threading.Event()
+
+    def marquee():
+        with marquee_engine.connect() as conn:
+            while not stop.is_set():
+                conn.exec_driver_sql('BEGIN IMMEDIATE')
+                conn.execute(text('UPDATE tickets SET is_available = is_available WHERE match_id = 1'))
+                time.sleep(HOLD_SECONDS)
+                conn.exec_driver_sql('COMMIT')
+                time.sleep(HOLD_SECONDS)
+
+    latencies = []
+
+    def booker(n):
+        client = app.test_client()
+        headers = {'Authorization': f'Bearer {token}'}
+        for i in range(BOOKINGS_PER_BOOKER):
+            match_id = 2 + (n + i) % (MATCHES - 1)
+            ticket_id = seats[match_id][n * BOOKINGS_PER_BOOKER + i]
+            started = time.perf_counter()
+            client.post('/api/book', json={'ticket_id': ticket_id}, headers=headers)
+            latencies.append(time.perf_counter() - started)
+
+    holder = threading.Thread(target=marquee)
+    holder.start()
+    started = time.perf_counter()
+    bookers = [threading.Thread(target=booker, args=(n,)) for n in range(BOOKERS)]
+    for thread in bookers:
+        thread.start()
+    for thread in bookers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    stop.set()
+    holder.join()
+
+    from booking_service import BookingService
+    with app.app_context():
+        report_started = time.perf_counter()
+        stats = BookingService().get_match_attendance_stats()
+        report = time.perf_counter() - report_started
+
+    latencies.sort()
+    print(json.dumps({
+        'mode': mode,
+        'bookings_per_second': len(latencies) / elapsed,
+        'p50_ms': statistics.median(latencies) * 1000,
+        'p95_ms': latencies[int(len(latencies) * 0.95)] * 1000,
+        'report_ms': report * 1000,
+        'booked': sum(s['booked'] for s in stats),
+    }))
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1:
+        run(sys.argv[1])
+        sys.exit(0)
+    print(f"{MATCHES} matches x {SEATS} seats, {BOOKERS} booking threads, marquee holds locks {HOLD_SECONDS * 1000:.0f}ms of every {HOLD_SECONDS * 2000:.0f}ms")
+    for mode in ('single', 'sharded'):
+        with tempfile.TemporaryDirectory() as tmp:
+            env = {**os.environ, **environment(tmp, mode == 'sharded'), 'PYTHONPATH': os.getcwd()}
+            out = subprocess.run([sys.executable, '-m', 'benchmarks.sharding', mode], env=env,
+                                 capture_output=True, text=True, check=True)
+            result = json.loads(out.stdout.strip().splitlines()[-1])
+            print(f"{mode:>8}: {result['bookings_per_second']:7.1f} bookings/s  p50 {result['p50_ms']:6.1f}ms  "
+                  f"p95 {result['p95_ms']:6.1f}ms  attendance report {result['report_ms']:5.1f}ms  "
+                  f"({result['booked']} seats booked)")
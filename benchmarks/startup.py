@@ -0,0 +1,87 @@
+"""Measure worker cold start: imports, create_app, optional warm-up and the
+latency of the first browse requests, each in a fresh interpreter.
+
+Run from the repository root: python -m benchmarks.startup
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RUNS = 5
+MATCHES = 20
+SEATS = 500
+
+os.environ.setdefault('SECRET_KEY', 'bench')
+os.environ.setdefault('PAYMENT_API_KEY', 'bench')
+os.environ.setdefault('PAYMENT_SECRET', 'bench')
+
+WORKER = r'''
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+if sys.argv[1] == 'warm':
+    from startup import warm_up
+    warm_up(app)
+warmed = time.perf_counter()
+client = app.test_client()
+first = {}
+for path in ('/api/matches', '/api/matches/1', '/api/matches/1/seatmap'):
+    t = time.perf_counter()
+    client.get(path)
+    first[path] = time.perf_counter() - t
+print(json.dumps({
+    'import': imported - started,
+    'create_app': created - imported,
+    'warm_up': warmed - created,
+    'first_requests': sum(first.values()),
+    'requests_loaded': 'requests' in sys.modules,
+    'jwt_loaded': 'jwt' in sys.modules,
+}))
+'''
+
+
+def seed(path):
+    os.environ['DATABASE_URL'] = f'sqlite:///{path}'
+    from datetime import datetime, timedelta
+    from app import create_app
+    from models import db, Match, Ticket
+    from migrations import upgrade
+
+    app = create_app()
+    with app.app_context():
+        upgrade(db.engine)
+        for i in range(MATCHES):
+            match = Match(home_team=f'Home {i}', away_team=f'Away {i}', venue='Ground', total_seats=SEATS,
+                          match_date=datetime.now() + timedelta(days=i + 1), ticket_price=50)
+            db.session.add(match)
+            db.session.flush()
+            db.session.add_all(
+                Ticket(match_id=match.id, seat_number=f'S{n:04d}', section=('North', 'South')[n % 2],
+                       price=50, is_available=n % 3 != 0)
+                for n in range(SEATS)
+            )
+        db.session.commit()
+
+
+def measure(mode):
+    out = subprocess.run([sys.executable, '-c', WORKER, mode], capture_output=True, text=True, check=True,
+                         env={**os.environ, 'PYTHONPATH': os.getcwd()})
+    return json.loads(out.stdout.strip().splitlines()[-1])
+
+
+if __name__ == '__main__':
+    with tempfile.TemporaryDirectory() as tmp:
+        seed(os.path.join(tmp, 'bench.db'))
+        print(f"{RUNS} runs per mode, {MATCHES} matches x {SEATS} seats, median ms")
+        for mode in ('cold', 'warm'):
+            runs = [measure(mode) for _ in range(RUNS)]
+            row = {key: statistics.median(run[key] for run in runs) * 1000
+                   for key in ('import', 'create_app', 'warm_up', 'first_requests')}
+            print(f"{mode:>5}: " + '  '.join(f"{key} {value:7.1f}" for key, value in row.items())
+                  + f"  requests loaded: {runs[0]['requests_loaded']}  jwt loaded: {runs[0]['jwt_loaded']}")
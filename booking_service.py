@@ -1,62 +1,131 @@
+from collections import Counter
+
 from models import db, Match, Ticket, Booking, User, BookingStatus, PaymentStatus
 from sqlalchemy.orm import joinedload
-from sqlalchemy import func
+from sqlalchemy import func, select, case
 from sqlalchemy.exc import SQLAlchemyError
-from utils import calculate_service_fee, format_currency
+from utils import SERVICE_FEE_BPS, service_fee_cents, format_currency
+from money import to_cents, from_cents, round_money, with_fees
+from replicas import read_only
+from projections import booking_history, DEFAULT_PAGE_SIZE
+from serializers import serialize_match, serialize_ticket
+from singleflight import read_cache
+from invalidation import invalidate_match, seats_changed
+from seatmap import HELD
+from outbox import record_event
+from archive import reporting_tables, archived_tickets
+from database import get_ticket, commit_seats
+from sharding import shard_router, use_match_shard
+import queries
+
+IN_CHUNK = 500
 
 class BookingService:
     
-    def get_all_matches_with_details(self):
-        matches_data = db.session.query(
-            Match,
-            func.count(Ticket.id).filter(Ticket.is_available == True).label('available_count'),
-            func.coalesce(func.sum(Booking.total_amount), 0).label('total_revenue')
-        ).outerjoin(Ticket, Match.id == Ticket.match_id
-        ).outerjoin(Booking, Ticket.booking_id == Booking.id
-        ).group_by(Match.id).all()
+    def get_match_details(self, match_id):
+        return read_cache.get_or_compute(('match', match_id), lambda: self._load_match_details(match_id))
+    
+    def _load_match_details(self, match_id):
+        match = Match.query.get(match_id)
+        if match is None:
+            return None
+        
+        with use_match_shard(match_id):
+            available_count = db.session.execute(queries.available_count(match_id)).scalar() or 0
+        
+        data = serialize_match(match)
+        data['available_seats'] = available_count
+        return data
+    
+    def get_available_tickets(self, match_id, page, per_page):
+        return read_cache.get_or_compute(
+            ('tickets', match_id, page, per_page),
+            lambda: self._load_available_tickets(match_id, page, per_page)
+        )
+    
+    def _load_available_tickets(self, match_id, page, per_page):
+        with use_match_shard(match_id):
+            tickets_page = db.paginate(queries.available_tickets(match_id), page=page, per_page=per_page, error_out=False)
+        return {
+            'tickets': [serialize_ticket(t) for t in tickets_page.items],
+            'total': tickets_page.total,
+            'pages': tickets_page.pages,
+            'current_page': page
+        }
+    
+    def _seat_totals(self, include_archived):
+        """``(match_id, booking_id, seats, available)`` rows gathered from
+        every inventory shard, plus archived tickets if asked for"""
+        def totals(tickets):
+            return select(
+                tickets.c.match_id,
+                tickets.c.booking_id,
+                func.count(tickets.c.id),
+                func.count(case((tickets.c.is_available == True, tickets.c.id)))
+            ).group_by(tickets.c.match_id, tickets.c.booking_id)
+        
+        rows = shard_router.scatter(totals(Ticket.__table__))
+        if include_archived:
+            rows += db.session.execute(totals(archived_tickets)).all()
+        return rows
+    
+    def _booking_amounts(self, bookings, booking_ids):
+        booking_ids = sorted(booking_ids)
+        amounts = {}
+        for i in range(0, len(booking_ids), IN_CHUNK):
+            amounts.update(db.session.execute(
+                select(bookings.c.id, bookings.c.total_amount).where(bookings.c.id.in_(booking_ids[i:i + IN_CHUNK]))
+            ).all())
+        return amounts
+    
+    @read_only
+    def get_all_matches_with_details(self, include_archived=False):
+        matches, _, bookings = reporting_tables(include_archived)
+        seat_totals = self._seat_totals(include_archived)
+        amounts = self._booking_amounts(bookings, {row[1] for row in seat_totals if row[1] is not None})
+        
+        available = Counter()
+        revenue_cents = Counter()
+        for match_id, booking_id, seats, free in seat_totals:
+            available[match_id] += free
+            if booking_id in amounts:
+                revenue_cents[match_id] += to_cents(amounts[booking_id]) * seats
         
         result = []
-        for match, available_count, total_revenue in matches_data:
+        for match_id, home_team, away_team in db.session.execute(
+            select(matches.c.id, matches.c.home_team, matches.c.away_team).order_by(matches.c.id)
+        ):
             result.append({
-                'match_id': match.id,
-                'home_team': match.home_team,
-                'away_team': match.away_team,
-                'available_tickets': available_count,
-                'total_revenue': float(total_revenue)
+                'match_id': match_id,
+                'home_team': home_team,
+                'away_team': away_team,
+                'available_tickets': available[match_id],
+                'total_revenue': from_cents(revenue_cents[match_id])
             })
         
         return result
     
-    def get_user_booking_history(self, user_id):
-        bookings = Booking.query.options(
-            joinedload(Booking.tickets).joinedload(Ticket.match)
-        ).filter_by(user_id=user_id).all()
-        
-        history = []
-        
-        for booking in bookings:
-            for ticket in booking.tickets:
-                history.append({
-                    'booking_id': booking.id,
-                    'match': f"{ticket.match.home_team} vs {ticket.match.away_team}",
-                    'seat': ticket.seat_number,
-                    'section': ticket.section,
-                    'amount': float(booking.total_amount) / len(booking.tickets) if booking.tickets else float(booking.total_amount),
-                    'status': booking.status.value if hasattr(booking.status, 'value') else str(booking.status)
-                })
-        
-        return history
+    def get_user_booking_history(self, user_id, page=1, per_page=DEFAULT_PAGE_SIZE):
+        return booking_history(user_id, page=page, per_page=per_page)
     
+    @read_only
     def generate_sales_report(self):
-        bookings = Booking.query.options(
-            joinedload(Booking.tickets).joinedload(Ticket.match),
-            joinedload(Booking.user)
-        ).all()
+        bookings = Booking.query.options(joinedload(Booking.user)).order_by(Booking.id).all()
+        matches = {m.id: m for m in Match.query.all()}
+        seats = {}
+        for booking_id, match_id, seat_number, _ in sorted(shard_router.scatter(
+            select(Ticket.booking_id, Ticket.match_id, Ticket.seat_number, Ticket.id).where(Ticket.booking_id.is_not(None))
+        ), key=lambda row: row[3]):
+            # A shard can hold tickets whose match row is gone from the
+            # primary; they cannot be reported.
+            match = matches.get(match_id)
+            if match is not None:
+                seats.setdefault(booking_id, []).append((match, seat_number))
         
         report_lines = []
         for booking in bookings:
-            for ticket in booking.tickets:
-                line = f"Booking #{booking.id}: {booking.user.username} - {ticket.match.home_team} vs {ticket.match.away_team} - Seat {ticket.seat_number} - {format_currency(booking.total_amount)}"
+            for match, seat_number in seats.get(booking.id, ()):
+                line = f"Booking #{booking.id}: {booking.user.username} - {match.home_team} vs {match.away_team} - Seat {seat_number} - {format_currency(booking.total_amount)}"
                 report_lines.append(line)
         
         return "\n".join(report_lines)
@@ -66,23 +135,21 @@ class BookingService:
         failed_bookings = []
         
         try:
-            total_amount = 0
             tickets_to_book = []
             
             for ticket_id in ticket_ids:
-                ticket = Ticket.query.with_for_update().get(ticket_id)
+                ticket = get_ticket(ticket_id, for_update=True)
                 
                 if ticket and ticket.is_available:
-                    ticket_price = float(ticket.price)
-                    total_amount += ticket_price + calculate_service_fee(ticket_price)
                     tickets_to_book.append(ticket)
                 else:
                     failed_bookings.append({'ticket_id': ticket_id, 'reason': 'Not available or does not exist'})
             
             if tickets_to_book:
+                total_cents, _ = with_fees([to_cents(t.price) for t in tickets_to_book], SERVICE_FEE_BPS)
                 booking = Booking(
                     user_id=user_id,
-                    total_amount=total_amount,
+                    total_amount=from_cents(total_cents),
                     status=BookingStatus.CONFIRMED,
                     payment_status=PaymentStatus.PENDING
                 )
@@ -93,8 +160,23 @@ class BookingService:
                     ticket.booking_id = booking.id
                     ticket.is_available = False
                     successful_bookings.append(ticket.id)
+                    record_event(db.session, 'seat.booked', 'ticket', ticket.id,
+                                 match_id=ticket.match_id, section=ticket.section, seat_number=ticket.seat_number,
+                                 booking_id=booking.id, price=round_money(ticket.price), discount=0,
+                                 fee=from_cents(service_fee_cents(to_cents(ticket.price))))
+                
+                record_event(db.session, 'booking.created', 'booking', booking.id,
+                             user_id=user_id, ticket_ids=successful_bookings,
+                             match_ids=sorted({t.match_id for t in tickets_to_book}), amount=booking.total_amount)
             
-            db.session.commit()
+            seats = [(ticket.match_id, ticket.id) for ticket in tickets_to_book]
+            if tickets_to_book:
+                commit_seats(booking.id, successful_bookings)
+            else:
+                db.session.commit()
+            for match_id in {match_id for match_id, _ in seats}:
+                invalidate_match(match_id)
+            seats_changed(seats, HELD)
         except SQLAlchemyError as e:
             db.session.rollback()
             raise e
@@ -102,30 +184,34 @@ class BookingService:
         return {'successful': successful_bookings, 'failed': failed_bookings}
     
     def check_seat_availability(self, match_id, seat_numbers):
-        available_tickets = Ticket.query.filter(
-            Ticket.match_id == match_id,
-            Ticket.seat_number.in_(seat_numbers),
-            Ticket.is_available == True
-        ).all()
+        with use_match_shard(match_id):
+            available_tickets = Ticket.query.filter(
+                Ticket.match_id == match_id,
+                Ticket.seat_number.in_(seat_numbers),
+                Ticket.is_available == True
+            ).all()
         
         return [ticket.seat_number for ticket in available_tickets]
     
-    def calculate_total_revenue(self):
-        total = db.session.query(func.sum(Booking.total_amount)).scalar() or 0
-        return float(total)
+    @read_only
+    def calculate_total_revenue(self, include_archived=False):
+        _, _, bookings = reporting_tables(include_archived)
+        total = db.session.execute(select(func.sum(bookings.c.total_amount))).scalar() or 0
+        return round_money(total)
     
-    def get_match_attendance_stats(self):
-        stats_data = db.session.query(
-            Match.id,
-            Match.home_team,
-            Match.away_team,
-            Match.total_seats,
-            func.count(Ticket.id).filter(Ticket.is_available == False).label('booked_count')
-        ).outerjoin(Ticket, Match.id == Ticket.match_id
-        ).group_by(Match.id).all()
+    @read_only
+    def get_match_attendance_stats(self, include_archived=False):
+        matches, _, _ = reporting_tables(include_archived)
+        booked = Counter()
+        for match_id, _, seats, free in self._seat_totals(include_archived):
+            booked[match_id] += seats - free
+        stats_data = db.session.execute(
+            select(matches.c.id, matches.c.home_team, matches.c.away_team, matches.c.total_seats).order_by(matches.c.id)
+        ).all()
         
         stats = []
-        for match_id, home_team, away_team, total_seats, booked_count in stats_data:
+        for match_id, home_team, away_team, total_seats in stats_data:
+            booked_count = booked[match_id]
             attendance_rate = (booked_count / total_seats) * 100 if total_seats > 0 else 0
             stats.append({
                 'match_id': match_id,
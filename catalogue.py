@@ -0,0 +1,304 @@
+"""Optional async app serving the public browse endpoints.
+
+Runs alongside the Flask app with an async driver (aiomysql or aiosqlite) and
+connection pool, so a worker waiting on the database keeps serving other
+browsers instead of holding a thread each:
+
+    uvicorn catalogue:app --workers 4
+
+Behind a load balancer, add ``--proxy-headers --forwarded-allow-ips <proxy>``
+so the search rate limit keys anonymous clients by their own address.
+
+Routes a proxy sends here answer exactly as the blueprint's do; statements
+come from ``queries`` and rows from ``models`` tables.
+"""
+import asyncio
+import json
+import logging
+import time
+from contextlib import asynccontextmanager
+from functools import wraps
+
+from sqlalchemy.engine import make_url
+from sqlalchemy.ext.asyncio import create_async_engine
+from werkzeug.exceptions import default_exceptions
+
+try:
+    from starlette.applications import Starlette
+    from starlette.concurrency import run_in_threadpool
+    from starlette.exceptions import HTTPException
+    from starlette.responses import JSONResponse
+    from starlette.routing import Route
+except ImportError as e:
+    raise ImportError("The catalogue app needs the optional starlette package (and uvicorn to serve it)") from e
+
+import queries
+from config import Config
+from ratelimit import RateLimiter, MemoryBackend, client_key
+from serializers import orjson, json_default, serialize_match, serialize_match_summary, serialize_ticket
+from sharding import ShardRouter
+
+logger = logging.getLogger(__name__)
+
+ASYNC_DRIVERS = {
+    'mysql': 'mysql+aiomysql',
+    'mysql+pymysql': 'mysql+aiomysql',
+    'sqlite': 'sqlite+aiosqlite',
+    'sqlite+pysqlite': 'sqlite+aiosqlite',
+}
+
+
+def async_url(url):
+    """The same database through its async driver"""
+    url = make_url(url)
+    if url.drivername in ASYNC_DRIVERS.values():
+        return url
+    try:
+        return url.set(drivername=ASYNC_DRIVERS[url.drivername])
+    except KeyError:
+        raise ValueError(f"No async driver known for {url.drivername} databases") from None
+
+
+def settings(overrides=None):
+    config = {name: getattr(Config, name) for name in dir(Config) if name.isupper()}
+    config.update(overrides or {})
+    return config
+
+
+class CatalogueDatabase:
+    """Async engines: matches are read from the primary, or from
+    ``CATALOGUE_DATABASE_URL`` (e.g. a replica) when set, and seat inventory
+    from the shard that owns it. Created inside the serving event loop, so
+    every worker process has pools of its own."""
+
+    def __init__(self, config):
+        options = {
+            'pool_size': config.get('CATALOGUE_POOL_SIZE', 20),
+            'max_overflow': config.get('CATALOGUE_MAX_OVERFLOW', 20),
+            'pool_timeout': config.get('CATALOGUE_POOL_TIMEOUT', 10),
+        }
+        self.router = ShardRouter()
+        self.router.configure(config)
+        url = config.get('CATALOGUE_DATABASE_URL') or config['SQLALCHEMY_DATABASE_URI']
+        self.primary = create_async_engine(async_url(url), **options)
+        binds = config.get('SQLALCHEMY_BINDS', {})
+        self.shards = {key: create_async_engine(async_url(binds[key]), **options) for key in self.router.keys}
+
+    def inventory(self, match_id):
+        key = self.router.shard_for_match(match_id)
+        return self.shards[key] if key else self.primary
+
+    async def all(self, engine, statement):
+        async with engine.connect() as conn:
+            return (await conn.execute(statement)).all()
+
+    async def page(self, engine, statement, offset, limit):
+        async with engine.connect() as conn:
+            total = await conn.scalar(queries.count(statement))
+            rows = (await conn.execute(statement.offset(offset).limit(limit))).all()
+        return total, rows
+
+    async def available_counts(self, match_ids):
+        groups = self.router.group_matches(match_ids)
+        results = await asyncio.gather(*(
+            self.all(self.shards[key] if key else self.primary, queries.available_counts(ids))
+            for key, ids in groups.items()
+        ))
+        return dict(row for rows in results for row in rows)
+
+    async def dispose(self):
+        for engine in (self.primary, *self.shards.values()):
+            await engine.dispose()
+
+
+class AsyncReadCache:
+    """The event loop's counterpart of ``singleflight.EarlyExpiryCache``:
+    values live for ``ttl`` seconds and concurrent misses for a key await one
+    load. It does not follow the invalidation bus, so writes made through the
+    Flask app show up here within ``ttl``."""
+
+    def __init__(self, ttl=2.0, max_entries=10000):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._entries = {}
+        self._loading = {}
+
+    async def get_or_compute(self, key, load):
+        entry = self._entries.get(key)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        future = self._loading.get(key)
+        if future is None:
+            future = self._loading[key] = asyncio.ensure_future(self._load(key, load))
+        # Shielded so one caller disconnecting does not cancel the others' load.
+        return await asyncio.shield(future)
+
+    async def _load(self, key, load):
+        try:
+            value = await load()
+            if self.ttl > 0:
+                self._entries[key] = (value, time.monotonic() + self.ttl)
+                if len(self._entries) > self.max_entries:
+                    del self._entries[next(iter(self._entries))]
+            return value
+        finally:
+            del self._loading[key]
+
+
+class CatalogueJSONResponse(JSONResponse):
+    """Encoded as ``jsonify`` encodes through ``FastJSONProvider``"""
+
+    def render(self, content):
+        if orjson is not None:
+            return orjson.dumps(content, default=json_default, option=orjson.OPT_NON_STR_KEYS | orjson.OPT_SORT_KEYS)
+        return json.dumps(content, default=json_default, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+
+def _int_arg(request, name, default):
+    try:
+        return int(request.query_params.get(name, default))
+    except ValueError:
+        return default
+
+
+def _page_args(request, default_per_page):
+    """``(page, offset, per_page)`` cleaned up the way
+    ``db.paginate(error_out=False)`` does it"""
+    page = _int_arg(request, 'page', 1)
+    per_page = min(_int_arg(request, 'per_page', default_per_page), queries.MAX_PER_PAGE)
+    if per_page < 1:
+        per_page = 20
+    return page, (max(page, 1) - 1) * per_page, per_page
+
+
+def rate_limited(name):
+    def decorator(endpoint):
+        @wraps(endpoint)
+        async def decorated(request):
+            limiter = request.app.state.limiter
+            if not limiter.enabled or name not in limiter.limits:
+                return await endpoint(request)
+            key = client_key(request.headers.get('Authorization'), request.client.host if request.client else None,
+                             request.app.state.config.get('SECRET_KEY'))
+            if isinstance(limiter.backend, MemoryBackend):
+                allowed, headers = limiter.hit(name, key)
+            else:
+                # The shared backends block on a round trip.
+                allowed, headers = await run_in_threadpool(limiter.hit, name, key)
+            if allowed:
+                response = await endpoint(request)
+            else:
+                response = CatalogueJSONResponse({'error': 'Rate limit exceeded'}, 429)
+            response.headers.update(headers)
+            return response
+        return decorated
+    return decorator
+
+
+async def list_matches(request):
+    page, offset, per_page = _page_args(request, 20)
+    db = request.app.state.db
+    total, rows = await db.page(db.primary, queries.matches(), offset, per_page)
+    available = await db.available_counts([row.id for row in rows])
+
+    result = []
+    for row in rows:
+        data = serialize_match(row)
+        data['available_seats'] = available.get(row.id, 0)
+        result.append(data)
+
+    return CatalogueJSONResponse({
+        'matches': result,
+        'total': total,
+        'pages': queries.page_count(total, per_page),
+        'current_page': page
+    })
+
+
+@rate_limited('search')
+async def search(request):
+    db = request.app.state.db
+    rows = await db.all(db.primary, queries.search_matches(request.query_params.get('q', '')))
+    return CatalogueJSONResponse({'results': [serialize_match_summary(row) for row in rows]})
+
+
+async def _load_match(db, match_id):
+    rows = await db.all(db.primary, queries.match(match_id))
+    if not rows:
+        return None
+    async with db.inventory(match_id).connect() as conn:
+        available_count = await conn.scalar(queries.available_count(match_id)) or 0
+    data = serialize_match(rows[0])
+    data['available_seats'] = available_count
+    return data
+
+
+async def get_match(request):
+    match_id = request.path_params['match_id']
+    state = request.app.state
+    data = await state.cache.get_or_compute(('match', match_id), lambda: _load_match(state.db, match_id))
+    if data is None:
+        raise HTTPException(404)
+    return CatalogueJSONResponse(data)
+
+
+async def _load_tickets(db, match_id, page, offset, per_page):
+    total, rows = await db.page(db.inventory(match_id), queries.available_tickets(match_id), offset, per_page)
+    return {
+        'tickets': [serialize_ticket(row) for row in rows],
+        'total': total,
+        'pages': queries.page_count(total, per_page),
+        'current_page': page
+    }
+
+
+async def get_tickets(request):
+    match_id = request.path_params['match_id']
+    page, offset, per_page = _page_args(request, 100)
+    state = request.app.state
+    return CatalogueJSONResponse(await state.cache.get_or_compute(
+        ('tickets', match_id, page, per_page),
+        lambda: _load_tickets(state.db, match_id, page, offset, per_page)
+    ))
+
+
+async def _http_error(request, exc):
+    error = default_exceptions.get(exc.status_code)
+    return CatalogueJSONResponse({'error': error.description if error else exc.detail}, exc.status_code,
+                                 headers=exc.headers)
+
+
+async def _server_error(request, exc):
+    logger.error(f"Unhandled exception: {exc}", exc_info=exc)
+    return CatalogueJSONResponse({'error': 'An internal server error occurred'}, 500)
+
+
+def create_catalogue_app(config=None):
+    config = settings(config)
+
+    @asynccontextmanager
+    async def lifespan(app):
+        app.state.db = CatalogueDatabase(config)
+        app.state.cache = AsyncReadCache(config.get('READ_CACHE_TTL', 2.0))
+        try:
+            yield
+        finally:
+            await app.state.db.dispose()
+
+    app = Starlette(
+        routes=[
+            Route('/api/matches', list_matches),
+            Route('/api/matches/search', search),
+            Route('/api/matches/{match_id:int}', get_match),
+            Route('/api/matches/{match_id:int}/tickets', get_tickets),
+        ],
+        exception_handlers={HTTPException: _http_error, Exception: _server_error},
+        lifespan=lifespan,
+    )
+    app.state.config = config
+    app.state.limiter = RateLimiter()
+    app.state.limiter.configure(config)
+    return app
+
+
+app = create_catalogue_app()
@@ -1,29 +1,96 @@
 import os
 
+
+def _split_env_list(name):
+    return [item.strip() for item in os.environ.get(name, '').split(',') if item.strip()]
+
+
+def _replica_binds(user, password, name):
+    urls = _split_env_list('DATABASE_REPLICA_URLS')
+    if not urls:
+        urls = [f"mysql+pymysql://{user}:{password}@{host}/{name}" for host in _split_env_list('DATABASE_REPLICA_HOSTS')]
+    return {f'replica_{i}': url for i, url in enumerate(urls)}
+
+
+def _shard_binds():
+    return {f'shard_{i}': url for i, url in enumerate(_split_env_list('SHARD_URLS'))}
+
+
+REQUIRED_SETTINGS = ('SECRET_KEY', 'PAYMENT_API_KEY', 'PAYMENT_SECRET')
+
+
+def validate_config(config):
+    """Raise if a required setting is missing. Called by create_app rather
+    than at import, so tools and preloading masters can import modules
+    without the full production environment."""
+    required = list(REQUIRED_SETTINGS)
+    if not config.get('DATABASE_URL'):
+        required.append('DATABASE_PASSWORD')
+    for name in required:
+        if not config.get(name):
+            raise ValueError(f"{name} environment variable must be set")
+
+
 class Config:
     SECRET_KEY = os.environ.get('SECRET_KEY')
-    if not SECRET_KEY:
-        raise ValueError("SECRET_KEY environment variable must be set")
     
+    DATABASE_URL = os.environ.get('DATABASE_URL')
     DATABASE_PASSWORD = os.environ.get('DATABASE_PASSWORD')
-    if not DATABASE_PASSWORD:
-        raise ValueError("DATABASE_PASSWORD environment variable must be set")
-    
     DATABASE_USER = os.environ.get('DATABASE_USER', 'root')
     DATABASE_HOST = os.environ.get('DATABASE_HOST', 'localhost')
     DATABASE_NAME = os.environ.get('DATABASE_NAME', 'football_tickets')
     
-    SQLALCHEMY_DATABASE_URI = f"mysql+pymysql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}/{DATABASE_NAME}"
+    SQLALCHEMY_DATABASE_URI = DATABASE_URL or f"mysql+pymysql://{DATABASE_USER}:{DATABASE_PASSWORD}@{DATABASE_HOST}/{DATABASE_NAME}"
+    SQLALCHEMY_BINDS = {**_replica_binds(DATABASE_USER, DATABASE_PASSWORD, DATABASE_NAME), **_shard_binds()}
+    REPLICA_BIND_KEYS = sorted(key for key in SQLALCHEMY_BINDS if key.startswith('replica_'))
+    REPLICA_MAX_LAG_SECONDS = float(os.environ.get('REPLICA_MAX_LAG_SECONDS', '5'))
+    REPLICA_LAG_CHECK_INTERVAL = float(os.environ.get('REPLICA_LAG_CHECK_INTERVAL', '10'))
     SQLALCHEMY_TRACK_MODIFICATIONS = False
     
-    PAYMENT_API_KEY = os.environ.get('PAYMENT_API_KEY')
-    if not PAYMENT_API_KEY:
-        raise ValueError("PAYMENT_API_KEY environment variable must be set")
+    SHARD_BIND_KEYS = list(_shard_binds())
+    SHARD_ID_SPAN = int(os.environ.get('SHARD_ID_SPAN', str(10 ** 8)))
+    SHARD_PINS = os.environ.get('SHARD_PINS', '')
     
+    PAYMENT_API_KEY = os.environ.get('PAYMENT_API_KEY')
     PAYMENT_SECRET = os.environ.get('PAYMENT_SECRET')
-    if not PAYMENT_SECRET:
-        raise ValueError("PAYMENT_SECRET environment variable must be set")
-    
     PAYMENT_API_BASE_URL = os.environ.get('PAYMENT_API_BASE_URL', 'https://api.paymentgateway.com')
     
+    DISCOUNT_CODES = os.environ.get('DISCOUNT_CODES')
+    DISCOUNT_CODES_FILE = os.environ.get('DISCOUNT_CODES_FILE')
+    DISCOUNT_RELOAD_INTERVAL = float(os.environ.get('DISCOUNT_RELOAD_INTERVAL', '5'))
+    
+    RATELIMIT_ENABLED = os.environ.get('RATELIMIT_ENABLED', 'True').lower() == 'true'
+    RATELIMIT_STORAGE_URL = os.environ.get('RATELIMIT_STORAGE_URL', '')
+    RATE_LIMITS = {
+        'book': '20/minute',
+        'book_bulk': '5/minute',
+        'login': '10/minute',
+        'search': '60/minute',
+    }
+    RATE_LIMITS_OVERRIDE = os.environ.get('RATE_LIMITS')
+    # Proxies in front of the app that append to X-Forwarded-For; client
+    # addresses (and anonymous rate limit keys) are read through them.
+    TRUSTED_PROXY_COUNT = int(os.environ.get('TRUSTED_PROXY_COUNT', '0'))
+    
+    READ_CACHE_TTL = float(os.environ.get('READ_CACHE_TTL', '2'))
+    READ_CACHE_BETA = float(os.environ.get('READ_CACHE_BETA', '1'))
+    
+    OUTBOX_BATCH_SIZE = int(os.environ.get('OUTBOX_BATCH_SIZE', '500'))
+    OUTBOX_POLL_INTERVAL = float(os.environ.get('OUTBOX_POLL_INTERVAL', '1'))
+    OUTBOX_MAX_LAG_SECONDS = float(os.environ.get('OUTBOX_MAX_LAG_SECONDS', '30'))
+    
+    INVALIDATION_BUS_URL = os.environ.get('INVALIDATION_BUS_URL', '')
+    INVALIDATION_POLL_INTERVAL = float(os.environ.get('INVALIDATION_POLL_INTERVAL', '0.5'))
+    # Seat maps are rebuilt this often; without a bus, every READ_CACHE_TTL.
+    SEATMAP_CACHE_TTL = float(os.environ.get('SEATMAP_CACHE_TTL', '30'))
+    
+    ARCHIVE_BATCH_SIZE = int(os.environ.get('ARCHIVE_BATCH_SIZE', '1000'))
+    
+    WARMUP_MATCHES = int(os.environ.get('WARMUP_MATCHES', '20'))
+    
+    CATALOGUE_DATABASE_URL = os.environ.get('CATALOGUE_DATABASE_URL')
+    CATALOGUE_POOL_SIZE = int(os.environ.get('CATALOGUE_POOL_SIZE', '20'))
+    CATALOGUE_MAX_OVERFLOW = int(os.environ.get('CATALOGUE_MAX_OVERFLOW', '20'))
+    CATALOGUE_POOL_TIMEOUT = float(os.environ.get('CATALOGUE_POOL_TIMEOUT', '10'))
+    
     DEBUG = os.environ.get('FLASK_DEBUG', 'False').lower() == 'true'
@@ -1,43 +1,107 @@
-from models import db, Match, Ticket, Booking, BookingStatus
-from sqlalchemy import text, or_, func, case
+from models import db, Ticket
+from sqlalchemy import text, func, case, select
 import logging
+from invalidation import invalidate_match, seats_changed
+from seatmap import AVAILABLE, SOLD
+from sharding import shard_router, use_shard, use_match_shard, use_ticket_shard
+import queries
 
 logger = logging.getLogger(__name__)
 
 def search_matches(search_term):
-    search_pattern = f"%{search_term}%"
-    return Match.query.filter(
-        or_(Match.home_team.like(search_pattern), Match.away_team.like(search_pattern))
-    ).all()
-
-def get_bookings_by_status(status):
-    status_map = {
-        'pending': BookingStatus.PENDING,
-        'confirmed': BookingStatus.CONFIRMED,
-        'cancelled': BookingStatus.CANCELLED
-    }
-    enum_status = status_map.get(status.lower())
-    if enum_status:
-        return Booking.query.filter_by(status=enum_status).all()
-    return Booking.query.filter_by(status=status).all()
+    return db.session.scalars(queries.search_matches(search_term)).all()
+
+def get_ticket(ticket_id, for_update=False):
+    try:
+        ticket_id = int(ticket_id)
+    except (TypeError, ValueError):
+        return None
+    if shard_router.enabled and shard_router.shard_for_ticket(ticket_id) is None:
+        return None
+    query = Ticket.query.with_for_update() if for_update else Ticket.query
+    with use_ticket_shard(ticket_id):
+        return query.get(ticket_id)
+
+def tickets_for_booking(booking_id):
+    """A booking's tickets; with sharding they can be spread over several shards"""
+    query = select(Ticket).where(Ticket.booking_id == booking_id).order_by(Ticket.id)
+    if not shard_router.enabled:
+        return db.session.scalars(query).all()
+    tickets = []
+    for key in shard_router.keys:
+        with use_shard(key):
+            tickets.extend(db.session.scalars(query))
+    return tickets
+
+def _engines_by_shard(ticket_ids):
+    groups = {}
+    for ticket_id in ticket_ids:
+        groups.setdefault(shard_router.shard_for_ticket(ticket_id), []).append(ticket_id)
+    return {db.engines[key]: ids for key, ids in groups.items()}
+
+def release_seats(booking_id, ticket_ids):
+    """Free the tickets still held by ``booking_id``, in a new transaction on
+    each shard"""
+    tickets = Ticket.__table__
+    for engine, ids in _engines_by_shard(ticket_ids).items():
+        with engine.begin() as conn:
+            conn.execute(tickets.update().where(
+                tickets.c.id.in_(ids), tickets.c.booking_id == booking_id
+            ).values(booking_id=None, is_available=True))
+
+def commit_seats(booking_id, ticket_ids, claim=True):
+    """Commit a session that changes the primary and the tickets of
+    ``booking_id`` on inventory shards, with no two-phase commit.
+
+    Claims commit the shards before the primary, releases the primary before
+    the shards, so a failure in between leaves seats held rather than sold
+    twice. The seats are then freed with ``release_seats``: a claim whose
+    booking was not committed is undone, a release whose shard commit failed
+    is retried.
+    """
+    if not shard_router.enabled:
+        db.session.commit()
+        return
+    db.session.flush()
+    first = list(_engines_by_shard(ticket_ids)) if claim else [db.engines[None]]
+    committed = False
+    try:
+        for engine in first:
+            # Committed on the DB-API connection: the session commits every
+            # bind in set order, and commits nothing once this one is done.
+            db.session.connection(bind_arguments={'bind': engine}).connection.dbapi_connection.commit()
+            committed = True
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if committed:
+            try:
+                release_seats(booking_id, ticket_ids)
+            except Exception as e:
+                logger.error(f"Could not release seats {ticket_ids} of booking {booking_id}: {e}", exc_info=True)
+        raise
 
 def update_ticket_availability(ticket_id, available):
-    ticket = Ticket.query.get(ticket_id)
+    ticket = get_ticket(ticket_id)
     if ticket:
         ticket.is_available = available
+        seats = [(ticket.match_id, ticket.id)]
         try:
             db.session.commit()
+            invalidate_match(ticket.match_id)
+            seats_changed(seats, AVAILABLE if available else SOLD)
         except Exception as e:
             db.session.rollback()
             logger.error(f"Failed to update ticket availability for ticket {ticket_id}: {e}", exc_info=True)
             raise e
 
 def get_match_statistics(match_id):
-    stats = db.session.query(
-        func.count(Ticket.id).label('total_tickets'),
-        func.sum(case((Ticket.is_available == True, 1), else_=0)).label('available_tickets'),
-        func.count(Booking.id).label('total_bookings')
-    ).select_from(Ticket).outerjoin(Booking).filter(Ticket.match_id == match_id).one_or_none()
+    with use_match_shard(match_id):
+        stats = db.session.query(
+            func.count(Ticket.id).label('total_tickets'),
+            func.sum(case((Ticket.is_available == True, 1), else_=0)).label('available_tickets'),
+            func.count(Ticket.booking_id).label('total_bookings')
+        ).filter(Ticket.match_id == match_id).one_or_none()
     
     if not stats:
         return {
@@ -0,0 +1,181 @@
+import json
+import logging
+import os
+import threading
+import time
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+
+from models import DiscountRedemption
+from money import to_basis_points, percent_of
+from utils import parse_utc
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_DISCOUNT_CODES = {'SAVE10': 10, 'SAVE20': 20, 'VIP50': 50}
+
+
+class DiscountCode:
+    __slots__ = ('code', 'percent', 'basis_points', 'match_id', 'section', 'max_uses', 'expires_at')
+
+    def __init__(self, code, percent, match_id=None, section=None, max_uses=None, expires_at=None):
+        self.code = code
+        self.percent = percent
+        self.basis_points = to_basis_points(percent)
+        self.match_id = match_id
+        self.section = section
+        self.max_uses = max_uses
+        self.expires_at = expires_at
+
+    @classmethod
+    def parse(cls, code, spec):
+        percent = spec if isinstance(spec, (int, float)) else spec['percent']
+        if not 0 <= Decimal(str(percent)) <= 100:
+            raise ValueError(f"percent must be between 0 and 100, not {percent}")
+        if isinstance(spec, (int, float)):
+            return cls(code, spec)
+        expires_at = spec.get('expires_at')
+        return cls(
+            code,
+            percent,
+            match_id=spec.get('match_id'),
+            section=spec.get('section'),
+            max_uses=spec.get('max_uses'),
+            expires_at=parse_utc(expires_at) if expires_at else None
+        )
+
+    def applies_to(self, match_id=None, section=None, now=None):
+        if self.expires_at is not None and (now or datetime.utcnow()) >= self.expires_at:
+            return False
+        if self.match_id is not None and match_id != self.match_id:
+            return False
+        if self.section is not None and section != self.section:
+            return False
+        return True
+
+
+class DiscountEngine:
+    """In-memory index of discount codes, parsed once and swapped atomically on reload.
+
+    Codes come from the ``DISCOUNT_CODES`` JSON and, when set, the
+    ``DISCOUNT_CODES_FILE`` JSON file, which is re-read whenever its mtime
+    changes. A code maps to a flat percentage or to an object with
+    ``percent`` and optional ``match_id``, ``section``, ``max_uses`` and
+    ``expires_at`` (ISO 8601; naive values are taken as UTC). An invalid
+    entry is skipped without affecting the others.
+
+    Redemptions are not released when a booking is refunded or cancelled:
+    a usage-limited code stays spent, as bookings do not record the code.
+    """
+
+    def __init__(self):
+        self._codes = None
+        self._source = json.dumps(DEFAULT_DISCOUNT_CODES)
+        self._path = None
+        self._mtime = None
+        self._checked_at = 0.0
+        self.check_interval = 5.0
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self._source = app.config.get('DISCOUNT_CODES') or self._source
+        self._path = app.config.get('DISCOUNT_CODES_FILE')
+        self.check_interval = app.config.get('DISCOUNT_RELOAD_INTERVAL', self.check_interval)
+        self.reload()
+        app.extensions['discount_engine'] = self
+
+    def _parse(self, raw):
+        try:
+            specs = json.loads(raw)
+        except ValueError as e:
+            logger.warning(f"Invalid discount code definitions ({e}), ignoring them")
+            return None
+        if not isinstance(specs, dict):
+            logger.warning("Discount code definitions must be a JSON object, ignoring them")
+            return None
+        codes = {}
+        for code, spec in specs.items():
+            try:
+                codes[code] = DiscountCode.parse(code, spec)
+            except (ValueError, KeyError, TypeError, AttributeError, InvalidOperation) as e:
+                logger.warning(f"Invalid discount code {code} ({e}), ignoring it")
+        return codes
+
+    def reload(self):
+        with self._lock:
+            codes = self._parse(self._source)
+            if codes is None:
+                codes = {code: DiscountCode(code, pct) for code, pct in DEFAULT_DISCOUNT_CODES.items()}
+            if self._path:
+                try:
+                    self._mtime = os.path.getmtime(self._path)
+                    with open(self._path) as f:
+                        codes.update(self._parse(f.read()) or {})
+                except OSError as e:
+                    logger.warning(f"Could not read discount codes file {self._path}: {e}")
+            self._codes = codes
+            self._checked_at = time.monotonic()
+        logger.info(f"Loaded {len(codes)} discount codes")
+
+    def _maybe_reload(self):
+        if self._codes is None:
+            self.reload()
+            return
+        if not self._path or time.monotonic() - self._checked_at < self.check_interval:
+            return
+        self._checked_at = time.monotonic()
+        try:
+            changed = os.path.getmtime(self._path) != self._mtime
+        except OSError:
+            changed = False
+        if changed:
+            self.reload()
+
+    def lookup(self, code, match_id=None, section=None, now=None):
+        self._maybe_reload()
+        discount = self._codes.get(code) if code else None
+        if discount is None or not discount.applies_to(match_id, section, now):
+            return None
+        return discount
+
+    def apply(self, price_cents, code, match_id=None, section=None, now=None):
+        discount = self.lookup(code, match_id, section, now)
+        if discount is None:
+            return price_cents
+        return price_cents - percent_of(price_cents, discount.basis_points)
+
+    def redeem(self, session, code):
+        """Count one use of ``code`` inside the caller's transaction.
+
+        Usage-limited codes are counted with a conditional single-row
+        ``UPDATE ... WHERE used < max_uses``, so no table lock is needed.
+        Returns False if the code has no uses left. Uses are never given
+        back, even when the booking is later refunded.
+        """
+        discount = self._codes.get(code) if self._codes and code else None
+        if discount is None or discount.max_uses is None:
+            return True
+
+        table = DiscountRedemption.__table__
+        increment = table.update().where(
+            table.c.code == code, table.c.used < discount.max_uses
+        ).values(used=table.c.used + 1)
+
+        if session.execute(increment).rowcount:
+            return True
+        if discount.max_uses < 1:
+            return False
+        if session.execute(select(table.c.used).where(table.c.code == code)).first() is not None:
+            return False
+        try:
+            with session.begin_nested():
+                session.execute(table.insert().values(code=code, used=1))
+            return True
+        except IntegrityError:
+            return bool(session.execute(increment).rowcount)
+
+
+discount_engine = DiscountEngine()
@@ -0,0 +1,9 @@
+wsgi_app = 'wsgi:app'
+preload_app = True
+
+
+def post_fork(server, worker):
+    from wsgi import app
+    from startup import after_fork
+
+    after_fork(app)
@@ -0,0 +1,251 @@
+import fcntl
+import json
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+
+from discounts import discount_engine
+from singleflight import read_cache
+from seatmap import seat_maps
+
+logger = logging.getLogger(__name__)
+
+
+class FileTransport:
+    """Shares messages through an append-only file; a stand-in for a real
+    broker when every worker runs on the same host, and in tests.
+
+    Once the file reaches ``max_bytes`` a sender moves it aside to
+    ``<path>.1`` and the next send starts a new one. Receivers keep reading
+    the old file through their open handle up to its end before following
+    the path, so a rotation loses nothing they had not read yet. Only a
+    receiver that falls more than a whole file behind misses messages, which
+    the bus sees as a sequence gap.
+    """
+
+    def __init__(self, path, max_bytes=10 * 1024 * 1024):
+        self.path = path
+        self.max_bytes = max_bytes
+        open(self.path, 'a').close()
+        self._file = open(self.path)
+        self._file.seek(0, os.SEEK_END)
+        self._buffer = ''
+
+    def send(self, message):
+        with open(self.path, 'a') as f:
+            f.write(message + '\n')
+            f.flush()
+            if self.max_bytes and f.tell() >= self.max_bytes:
+                self._rotate(f)
+
+    def _rotate(self, f):
+        # Under an exclusive lock, and only if no other sender has rotated
+        # this file already.
+        fcntl.flock(f, fcntl.LOCK_EX)
+        try:
+            if _inode(self.path) == os.fstat(f.fileno()).st_ino:
+                os.replace(self.path, self.path + '.1')
+        finally:
+            fcntl.flock(f, fcntl.LOCK_UN)
+
+    def receive(self, timeout):
+        if os.fstat(self._file.fileno()).st_size < self._file.tell():
+            self._file.seek(0)
+            self._buffer = ''
+            raise ConnectionResetError(f"{self.path} was truncated")
+        data = self._file.read()
+        if not data:
+            current = _inode(self.path)
+            if current is not None and current != os.fstat(self._file.fileno()).st_ino:
+                self._file.close()
+                self._file = open(self.path)
+                self._buffer = ''
+                return self.receive(0)
+            time.sleep(timeout)
+            return []
+        lines = (self._buffer + data).split('\n')
+        self._buffer = lines.pop()
+        return [line for line in lines if line]
+
+
+def _inode(path):
+    try:
+        return os.stat(path).st_ino
+    except FileNotFoundError:
+        return None
+
+
+class RedisTransport:
+    """Redis pub/sub; needs the optional ``redis`` package"""
+
+    def __init__(self, url, channel='invalidations'):
+        import redis
+        self.channel = channel
+        self._client = redis.Redis.from_url(url)
+        self._pubsub = self._client.pubsub(ignore_subscribe_messages=True)
+        self._pubsub.subscribe(channel)
+
+    def send(self, message):
+        self._client.publish(self.channel, message)
+
+    def receive(self, timeout):
+        message = self._pubsub.get_message(timeout=timeout)
+        return [message['data'].decode('utf-8')] if message else []
+
+
+def create_transport(url):
+    if not url:
+        return None
+    if url.startswith('file://'):
+        return FileTransport(url[len('file://'):])
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return RedisTransport(url)
+    raise ValueError(f"Unsupported INVALIDATION_BUS_URL: {url}")
+
+
+class InvalidationBus:
+    """Broadcasts keyed invalidations, such as ``match`` availability or the
+    ``discounts`` table, to every other worker and node.
+
+    Each publisher numbers its messages; a receiver that sees a gap in a
+    publisher's sequence has missed something and falls back to a full
+    refresh of everything it caches.
+    """
+
+    def __init__(self):
+        self.transport = None
+        self.poll_interval = 0.5
+        self.handlers = {}
+        self.full_refresh_handlers = []
+        self.stats = {'sent': 0, 'received': 0, 'gaps': 0, 'full_refreshes': 0}
+        self._url = None
+        self._pid = None
+        self._node_id = None
+        self._seq = 0
+        self._last_seen = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def init_app(self, app):
+        self._url = app.config.get('INVALIDATION_BUS_URL')
+        self.poll_interval = app.config.get('INVALIDATION_POLL_INTERVAL', self.poll_interval)
+        self.transport = None
+        self._pid = None
+        if self._url:
+            app.before_request(self.ensure_started)
+        app.extensions['invalidation_bus'] = self
+
+    def subscribe(self, kind, handler):
+        self.handlers.setdefault(kind, []).append(handler)
+
+    def on_full_refresh(self, handler):
+        self.full_refresh_handlers.append(handler)
+
+    def ensure_started(self):
+        # Connections and threads do not survive fork, so each worker
+        # process gets its own transport, node id and listener.
+        if not self._url or self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            self._pid = os.getpid()
+            self._node_id = f"{socket.gethostname()}:{self._pid}:{uuid.uuid4().hex[:8]}"
+            self._seq = 0
+            self._last_seen = {}
+            self._stop = threading.Event()
+            self.transport = create_transport(self._url)
+            self._thread = threading.Thread(target=self._listen, name='invalidation-bus', daemon=True)
+            self._thread.start()
+
+    def publish(self, kind, key=None):
+        if not self._url:
+            return
+        self.ensure_started()
+        with self._lock:
+            self._seq += 1
+            message = json.dumps({'node': self._node_id, 'seq': self._seq, 'kind': kind, 'key': key})
+        try:
+            self.transport.send(message)
+            self.stats['sent'] += 1
+        except Exception as e:
+            logger.error(f"Failed to publish {kind} invalidation: {e}")
+
+    def stop(self):
+        self._stop.set()
+
+    def _listen(self):
+        while not self._stop.is_set():
+            try:
+                for raw in self.transport.receive(self.poll_interval):
+                    self.handle(raw)
+            except Exception as e:
+                logger.error(f"Invalidation bus receive failed: {e}")
+                self._full_refresh()
+                self._stop.wait(self.poll_interval)
+
+    def handle(self, raw):
+        message = json.loads(raw)
+        node, seq = message['node'], message['seq']
+        if node == self._node_id:
+            return
+        self.stats['received'] += 1
+        last = self._last_seen.get(node)
+        if last is not None and seq <= last:
+            return
+        self._last_seen[node] = seq
+        if last is not None and seq > last + 1:
+            self.stats['gaps'] += 1
+            logger.warning(f"Missed invalidations {last + 1}..{seq - 1} from {node}")
+            self._full_refresh()
+            return
+        for handler in self.handlers.get(message['kind'], ()):
+            handler(message['key'])
+
+    def _full_refresh(self):
+        self.stats['full_refreshes'] += 1
+        for handler in self.full_refresh_handlers:
+            try:
+                handler()
+            except Exception as e:
+                logger.error(f"Full refresh handler failed: {e}", exc_info=True)
+
+
+invalidation_bus = InvalidationBus()
+invalidation_bus.subscribe('match', read_cache.invalidate_match)
+invalidation_bus.subscribe('discounts', lambda key: discount_engine.reload())
+invalidation_bus.subscribe('seats', lambda key: seat_maps.apply(key['match_id'], key['changes']))
+invalidation_bus.subscribe('seatmap', seat_maps.invalidate)
+invalidation_bus.on_full_refresh(read_cache.clear)
+invalidation_bus.on_full_refresh(seat_maps.clear)
+invalidation_bus.on_full_refresh(discount_engine.reload)
+
+
+def invalidate_match(match_id):
+    read_cache.invalidate_match(match_id)
+    invalidation_bus.publish('match', match_id)
+
+
+def reload_discounts():
+    discount_engine.reload()
+    invalidation_bus.publish('discounts')
+
+
+def seats_changed(seats, state):
+    """Apply a committed state change to ``seats`` (``(match_id, ticket_id)``
+    pairs) to the local seat maps and every other node's"""
+    by_match = {}
+    for match_id, ticket_id in seats:
+        by_match.setdefault(match_id, []).append((ticket_id, state))
+    for match_id, changes in by_match.items():
+        seat_maps.apply(match_id, changes)
+        invalidation_bus.publish('seats', {'match_id': match_id, 'changes': changes})
+
+
+def drop_seat_map(match_id):
+    seat_maps.invalidate(match_id)
+    invalidation_bus.publish('seatmap', match_id)
@@ -0,0 +1,323 @@
+import logging
+import re
+import sys
+from datetime import datetime
+
+from sqlalchemy import (BigInteger, Boolean, Column, DateTime, Enum, ForeignKey, Index, Integer, MetaData, Numeric,
+                        String, Table, Text, UniqueConstraint, func, inspect, select, text)
+
+from models import db, Match, Ticket, Booking, Payment, BookingStatus
+
+logger = logging.getLogger(__name__)
+
+version_metadata = MetaData()
+
+schema_migrations = Table(
+    'schema_migrations', version_metadata,
+    Column('version', Integer, primary_key=True),
+    Column('name', String(100), nullable=False),
+    Column('applied_at', DateTime, nullable=False, default=datetime.utcnow),
+)
+
+MIGRATIONS = []
+# Seat inventory shards hold only ``tickets`` and keep their own history,
+# in a ``schema_migrations`` table on each shard.
+SHARD_MIGRATIONS = []
+
+
+def migration(version, name, registry=MIGRATIONS):
+    def register(fn):
+        registry.append((version, name, fn))
+        registry.sort(key=lambda m: m[0])
+        return fn
+    return register
+
+
+def shard_migration(version, name):
+    return migration(version, name, SHARD_MIGRATIONS)
+
+
+# Each migration builds its DDL from tables frozen here as they stood when it
+# was written, never from the live models, so replaying the history gives
+# the same schema whatever the models look like later.
+
+def _create_indexes(conn, indexes):
+    for index in indexes:
+        existing = {ix['name'] for ix in inspect(conn).get_indexes(index.table.name)}
+        if index.name not in existing:
+            index.create(conn)
+
+
+def _columns_without_keys(table):
+    return [Column(c.name, c.type, primary_key=c.primary_key, nullable=c.nullable) for c in table.columns]
+
+
+def _archive_table(metadata, table, *indexes):
+    return Table(f'archived_{table.name}', metadata, *_columns_without_keys(table), *indexes)
+
+
+v1 = MetaData()
+v1_users = Table(
+    'users', v1,
+    Column('id', Integer, primary_key=True),
+    Column('username', String(80), unique=True, nullable=False),
+    Column('email', String(120), unique=True, nullable=False),
+    Column('password', String(255), nullable=False),
+    Column('is_admin', Boolean),
+    Column('created_at', DateTime),
+)
+v1_matches = Table(
+    'matches', v1,
+    Column('id', Integer, primary_key=True),
+    Column('home_team', String(100), nullable=False),
+    Column('away_team', String(100), nullable=False),
+    Column('venue', String(200), nullable=False),
+    Column('match_date', DateTime, nullable=False),
+    Column('total_seats', Integer),
+    Column('ticket_price', Numeric(10, 2), nullable=False),
+)
+v1_bookings = Table(
+    'bookings', v1,
+    Column('id', Integer, primary_key=True),
+    Column('user_id', Integer, ForeignKey('users.id'), nullable=False),
+    Column('booking_date', DateTime),
+    Column('status', Enum('PENDING', 'CONFIRMED', 'CANCELLED', name='bookingstatus'), nullable=False),
+    Column('payment_status', Enum('UNPAID', 'PENDING', 'PAID', 'REFUNDED', name='paymentstatus'), nullable=False),
+    Column('total_amount', Numeric(10, 2), nullable=False),
+)
+v1_tickets = Table(
+    'tickets', v1,
+    Column('id', Integer, primary_key=True),
+    Column('match_id', Integer, ForeignKey('matches.id'), nullable=False),
+    Column('seat_number', String(10), nullable=False),
+    Column('section', String(50), nullable=False),
+    Column('price', Numeric(10, 2), nullable=False),
+    Column('is_available', Boolean),
+    Column('booking_id', Integer, ForeignKey('bookings.id'), nullable=True),
+    UniqueConstraint('match_id', 'seat_number', 'section', name='_match_seat_section_uc'),
+)
+v1_payments = Table(
+    'payments', v1,
+    Column('id', Integer, primary_key=True),
+    Column('booking_id', Integer, ForeignKey('bookings.id'), nullable=False),
+    Column('amount', Numeric(10, 2), nullable=False),
+    Column('payment_method', String(50), nullable=False),
+    Column('transaction_id', String(100)),
+    Column('status', Enum('PENDING', 'SUCCESS', 'FAILED', 'REFUNDED', name='paymentprocessingstatus'),
+           nullable=False),
+    Column('created_at', DateTime),
+)
+
+
+@migration(1, 'initial_schema')
+def initial_schema(conn):
+    v1.create_all(conn)
+
+
+@migration(2, 'hot_query_indexes')
+def hot_query_indexes(conn):
+    _create_indexes(conn, [
+        Index('ix_matches_match_date', v1_matches.c.match_date),
+        Index('ix_tickets_match_available', v1_tickets.c.match_id, v1_tickets.c.is_available,
+              v1_tickets.c.section, v1_tickets.c.seat_number),
+        Index('ix_tickets_booking_id', v1_tickets.c.booking_id),
+        Index('ix_bookings_user_id', v1_bookings.c.user_id, v1_bookings.c.booking_date),
+        Index('ix_bookings_status', v1_bookings.c.status),
+        Index('ix_payments_booking_id', v1_payments.c.booking_id),
+        Index('ix_payments_transaction_id', v1_payments.c.transaction_id),
+    ])
+
+
+@migration(3, 'discount_redemptions')
+def discount_redemptions(conn):
+    Table(
+        'discount_redemptions', MetaData(),
+        Column('code', String(50), primary_key=True),
+        Column('used', Integer, nullable=False),
+    ).create(conn, checkfirst=True)
+
+
+@migration(4, 'outbox')
+def outbox(conn):
+    metadata = MetaData()
+    Table(
+        'outbox_events', metadata,
+        Column('id', BigInteger().with_variant(Integer, 'sqlite'), primary_key=True),
+        Column('event_type', String(50), nullable=False),
+        Column('aggregate_type', String(50), nullable=False),
+        Column('aggregate_id', Integer, nullable=False),
+        Column('payload', Text, nullable=False),
+        Column('created_at', DateTime, nullable=False),
+    )
+    Table(
+        'outbox_offsets', metadata,
+        Column('relay', String(50), primary_key=True),
+        Column('last_event_id', BigInteger, nullable=False),
+        Column('updated_at', DateTime),
+    )
+    metadata.create_all(conn)
+
+
+@migration(5, 'archive_tables')
+def archive_tables(conn):
+    metadata = MetaData()
+    _archive_table(metadata, v1_matches, Index('ix_archived_matches_match_date', 'match_date'))
+    _archive_table(metadata, v1_tickets, Index('ix_archived_tickets_match_id', 'match_id'),
+                   Index('ix_archived_tickets_booking_id', 'booking_id'))
+    _archive_table(metadata, v1_bookings, Index('ix_archived_bookings_user_id', 'user_id'))
+    _archive_table(metadata, v1_payments, Index('ix_archived_payments_booking_id', 'booking_id'))
+    metadata.create_all(conn)
+
+
+@migration(6, 'sales_rollups')
+def sales_rollups(conn):
+    Table(
+        'sales_rollups', MetaData(),
+        Column('bucket_start', DateTime, primary_key=True),
+        Column('match_id', Integer, primary_key=True, autoincrement=False),
+        Column('section', String(50), primary_key=True),
+        Column('tickets_sold', Integer, nullable=False),
+        Column('tickets_refunded', Integer, nullable=False),
+        Column('gross_cents', BigInteger, nullable=False),
+        Column('fees_cents', BigInteger, nullable=False),
+        Column('discounts_cents', BigInteger, nullable=False),
+        Column('refunds_cents', BigInteger, nullable=False),
+    ).create(conn, checkfirst=True)
+
+
+@migration(7, 'outbox_gaps')
+def outbox_gaps(conn):
+    Table(
+        'outbox_gaps', MetaData(),
+        Column('relay', String(50), primary_key=True),
+        Column('event_id', BigInteger, primary_key=True, autoincrement=False),
+        Column('skipped_at', DateTime, nullable=False),
+    ).create(conn, checkfirst=True)
+
+
+@shard_migration(1, 'shard_tickets')
+def shard_tickets(conn, first_id):
+    # v1 tickets with the indexes of migration 2, minus the foreign keys:
+    # matches and bookings stay on the primary. Ids start at ``first_id``.
+    Table(
+        'tickets', MetaData(), *_columns_without_keys(v1_tickets),
+        UniqueConstraint('match_id', 'seat_number', 'section', name='_match_seat_section_uc'),
+        Index('ix_tickets_match_available', 'match_id', 'is_available', 'section', 'seat_number'),
+        Index('ix_tickets_booking_id', 'booking_id'),
+        sqlite_autoincrement=True,
+        mysql_auto_increment=str(first_id),
+    ).create(conn, checkfirst=True)
+    if conn.dialect.name == 'sqlite':
+        seeded = conn.execute(text("SELECT 1 FROM sqlite_sequence WHERE name = 'tickets'")).first()
+        if not seeded:
+            conn.execute(text("INSERT INTO sqlite_sequence (name, seq) VALUES ('tickets', :seq)"),
+                         {'seq': first_id - 1})
+
+
+def applied_versions(conn):
+    version_metadata.create_all(conn)
+    return {row.version for row in conn.execute(select(schema_migrations.c.version))}
+
+
+def _upgrade(engine, migrations, target, *args):
+    applied = []
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    for version, name, fn in migrations:
+        if version in done or (target is not None and version > target):
+            continue
+        with engine.begin() as conn:
+            fn(conn, *args)
+            conn.execute(schema_migrations.insert().values(version=version, name=name, applied_at=datetime.utcnow()))
+        logger.info(f"Applied migration {version:03d} {name}")
+        applied.append(version)
+    return applied
+
+
+def upgrade(engine, target=None):
+    return _upgrade(engine, MIGRATIONS, target)
+
+
+def upgrade_shard(engine, first_id, target=None):
+    """Apply pending shard migrations; ticket ids on the shard start at ``first_id``"""
+    return _upgrade(engine, SHARD_MIGRATIONS, target, first_id)
+
+
+def upgrade_shards(router, engines):
+    return {key: upgrade_shard(engines[key], router.first_ticket_id(key)) for key in router.keys}
+
+
+def pending_migrations(engine, migrations=MIGRATIONS):
+    with engine.begin() as conn:
+        done = applied_versions(conn)
+    return [(version, name) for version, name, _ in migrations if version not in done]
+
+
+HOT_QUERIES = {
+    'available_tickets_page': select(Ticket.id, Ticket.seat_number, Ticket.section, Ticket.price).where(
+        Ticket.match_id == 1, Ticket.is_available == True),
+    'available_ticket_count': select(func.count(Ticket.id)).where(
+        Ticket.match_id == 1, Ticket.is_available == True),
+    'tickets_by_booking': select(Ticket.id).where(Ticket.booking_id == 1),
+    'bookings_by_user': select(Booking.id, Booking.booking_date).where(Booking.user_id == 1),
+    'bookings_by_status': select(Booking.id).where(Booking.status == BookingStatus.PENDING),
+    'payment_by_booking': select(Payment.id, Payment.transaction_id).where(Payment.booking_id == 1),
+    'payment_by_transaction': select(Payment.id).where(Payment.transaction_id == 'txn'),
+    'matches_by_date': select(Match.id).where(Match.match_date >= datetime(2000, 1, 1)),
+}
+
+_SQLITE_SCAN = re.compile(r'^SCAN (?:TABLE )?(\w+)$')
+
+
+def _full_scans(conn, sql):
+    dialect = conn.dialect.name
+    if dialect == 'sqlite':
+        rows = conn.exec_driver_sql(f'EXPLAIN QUERY PLAN {sql}').all()
+        return [m.group(1) for m in (_SQLITE_SCAN.match(row[-1]) for row in rows) if m]
+    if dialect == 'mysql':
+        rows = conn.exec_driver_sql(f'EXPLAIN {sql}').mappings().all()
+        return [row['table'] for row in rows if row['type'] == 'ALL']
+    return []
+
+
+def check_query_plans(engine, queries=HOT_QUERIES):
+    """Return {query name: [tables scanned]} for hot queries that no longer use an index.
+
+    MySQL may legitimately scan near-empty tables, so run this against a seeded database.
+    """
+    regressions = {}
+    with engine.connect() as conn:
+        for name, stmt in queries.items():
+            sql = str(stmt.compile(dialect=conn.dialect, compile_kwargs={'literal_binds': True}))
+            scanned = _full_scans(conn, sql)
+            if scanned:
+                regressions[name] = scanned
+    return regressions
+
+
+if __name__ == '__main__':
+    from app import create_app
+    from sharding import shard_router
+
+    command = sys.argv[1] if len(sys.argv) > 1 else 'upgrade'
+    app = create_app()
+    with app.app_context():
+        engine = db.engine
+        if command == 'upgrade':
+            applied = upgrade(engine)
+            upgrade_shards(shard_router, db.engines)
+            print(f"Applied migrations: {applied}" if applied else "Database is up to date")
+        elif command == 'status':
+            for version, name in pending_migrations(engine):
+                print(f"pending {version:03d} {name}")
+            for key in shard_router.keys:
+                for version, name in pending_migrations(db.engines[key], SHARD_MIGRATIONS):
+                    print(f"pending {version:03d} {name} on {key}")
+        elif command == 'check':
+            regressions = check_query_plans(engine)
+            for name, tables in regressions.items():
+                print(f"FULL SCAN {name}: {', '.join(tables)}")
+            sys.exit(1 if regressions else 0)
+        else:
+            print("Usage: python migrations.py [upgrade|status|check]")
+            sys.exit(2)
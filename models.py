@@ -1,9 +1,10 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
-from sqlalchemy import UniqueConstraint, Enum as SQLEnum
+from sqlalchemy import UniqueConstraint, Index, Enum as SQLEnum
 import enum
+from replicas import RoutingSession
 
-db = SQLAlchemy()
+db = SQLAlchemy(session_options={'class_': RoutingSession})
 
 class User(db.Model):
     __tablename__ = 'users'
@@ -23,6 +24,7 @@ class User(db.Model):
 
 class Match(db.Model):
     __tablename__ = 'matches'
+    __table_args__ = (Index('ix_matches_match_date', 'match_date'),)
     
     id = db.Column(db.Integer, primary_key=True)
     home_team = db.Column(db.String(100), nullable=False)
@@ -40,7 +42,11 @@ class Match(db.Model):
 
 class Ticket(db.Model):
     __tablename__ = 'tickets'
-    __table_args__ = (UniqueConstraint('match_id', 'seat_number', 'section', name='_match_seat_section_uc'),)
+    __table_args__ = (
+        UniqueConstraint('match_id', 'seat_number', 'section', name='_match_seat_section_uc'),
+        Index('ix_tickets_match_available', 'match_id', 'is_available', 'section', 'seat_number'),
+        Index('ix_tickets_booking_id', 'booking_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     match_id = db.Column(db.Integer, db.ForeignKey('matches.id'), nullable=False)
@@ -73,6 +79,10 @@ class PaymentProcessingStatus(enum.Enum):
 
 class Booking(db.Model):
     __tablename__ = 'bookings'
+    __table_args__ = (
+        Index('ix_bookings_user_id', 'user_id', 'booking_date'),
+        Index('ix_bookings_status', 'status'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
@@ -89,6 +99,10 @@ class Booking(db.Model):
 
 class Payment(db.Model):
     __tablename__ = 'payments'
+    __table_args__ = (
+        Index('ix_payments_booking_id', 'booking_id'),
+        Index('ix_payments_transaction_id', 'transaction_id'),
+    )
     
     id = db.Column(db.Integer, primary_key=True)
     booking_id = db.Column(db.Integer, db.ForeignKey('bookings.id'), nullable=False)
@@ -101,4 +115,66 @@ class Payment(db.Model):
     booking = db.relationship('Booking', backref=db.backref('payment', uselist=False))
     
     def __repr__(self):
-        return f'<Payment {self.transaction_id}>'
\ No newline at end of file
+        return f'<Payment {self.transaction_id}>'
+
+
+class DiscountRedemption(db.Model):
+    __tablename__ = 'discount_redemptions'
+    
+    code = db.Column(db.String(50), primary_key=True)
+    used = db.Column(db.Integer, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<DiscountRedemption {self.code}: {self.used}>'
+
+class OutboxEvent(db.Model):
+    __tablename__ = 'outbox_events'
+    
+    id = db.Column(db.BigInteger().with_variant(db.Integer, 'sqlite'), primary_key=True)
+    event_type = db.Column(db.String(50), nullable=False)
+    aggregate_type = db.Column(db.String(50), nullable=False)
+    aggregate_id = db.Column(db.Integer, nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<OutboxEvent {self.id} {self.event_type}>'
+
+
+class OutboxOffset(db.Model):
+    __tablename__ = 'outbox_offsets'
+    
+    relay = db.Column(db.String(50), primary_key=True)
+    last_event_id = db.Column(db.BigInteger, default=0, nullable=False)
+    updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
+    
+    def __repr__(self):
+        return f'<OutboxOffset {self.relay}: {self.last_event_id}>'
+
+
+class OutboxGap(db.Model):
+    __tablename__ = 'outbox_gaps'
+    
+    relay = db.Column(db.String(50), primary_key=True)
+    event_id = db.Column(db.BigInteger, primary_key=True, autoincrement=False)
+    skipped_at = db.Column(db.DateTime, default=datetime.utcnow, nullable=False)
+    
+    def __repr__(self):
+        return f'<OutboxGap {self.relay}: {self.event_id}>'
+
+
+class SalesRollup(db.Model):
+    __tablename__ = 'sales_rollups'
+    
+    bucket_start = db.Column(db.DateTime, primary_key=True)
+    match_id = db.Column(db.Integer, primary_key=True, autoincrement=False)
+    section = db.Column(db.String(50), primary_key=True)
+    tickets_sold = db.Column(db.Integer, default=0, nullable=False)
+    tickets_refunded = db.Column(db.Integer, default=0, nullable=False)
+    gross_cents = db.Column(db.BigInteger, default=0, nullable=False)
+    fees_cents = db.Column(db.BigInteger, default=0, nullable=False)
+    discounts_cents = db.Column(db.BigInteger, default=0, nullable=False)
+    refunds_cents = db.Column(db.BigInteger, default=0, nullable=False)
+    
+    def __repr__(self):
+        return f'<SalesRollup {self.bucket_start} {self.match_id} {self.section}>'
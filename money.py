@@ -0,0 +1,66 @@
+"""Money is handled as integer cents everywhere prices are computed.
+
+Convert with ``to_cents`` when reading ``Numeric`` columns or config values
+and with ``from_cents`` when writing back or returning amounts; rates are
+integer basis points so fees and discounts never pass through ``float``.
+"""
+from decimal import Decimal, ROUND_HALF_UP
+
+CENT = Decimal('0.01')
+
+
+def to_cents(amount):
+    if isinstance(amount, int):
+        return amount * 100
+    if not isinstance(amount, Decimal):
+        amount = Decimal(str(amount))
+    return int(amount.quantize(CENT, rounding=ROUND_HALF_UP) * 100)
+
+
+def from_cents(cents):
+    return Decimal(cents).scaleb(-2)
+
+
+def round_money(amount):
+    return from_cents(to_cents(amount))
+
+
+def to_basis_points(rate_percent):
+    return int(Decimal(str(rate_percent)).scaleb(2).quantize(Decimal(1), rounding=ROUND_HALF_UP))
+
+
+def percent_of(cents, basis_points):
+    """``cents * basis_points / 10000``, rounded half up"""
+    return (cents * basis_points + 5000) // 10000
+
+
+def with_fees(prices_cents, fee_basis_points):
+    """Total of each price plus its own rounded fee, as ``(total, fees)``"""
+    fees = sum(percent_of(p, fee_basis_points) for p in prices_cents)
+    return sum(prices_cents) + fees, fees
+
+
+def _portion(cents, weight, total_weight):
+    return (2 * cents * weight + total_weight) // (2 * total_weight)
+
+
+def share_of(cents, weight_before, weight, total_weight):
+    """One part's share of ``cents`` split in proportion to weight.
+
+    Shares are differences of rounded running totals, so the parts of a
+    split, taken in the same order, add up to ``cents`` exactly while each
+    share needs only the weights before it.
+    """
+    if total_weight <= 0:
+        return 0 if weight_before else cents
+    return _portion(cents, weight_before + weight, total_weight) - _portion(cents, weight_before, total_weight)
+
+
+def allocate_by_weight(cents, weights):
+    """Split ``cents`` in proportion to ``weights``; the shares add up exactly"""
+    total_weight = sum(weights)
+    shares, before = [], 0
+    for weight in weights:
+        shares.append(share_of(cents, before, weight, total_weight))
+        before += weight
+    return shares
@@ -0,0 +1,270 @@
+import json
+import logging
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+
+from sqlalchemy import select, func
+
+from models import OutboxEvent, OutboxOffset, OutboxGap
+from serializers import json_default
+
+logger = logging.getLogger(__name__)
+
+
+def record_event(session, event_type, aggregate_type, aggregate_id, **payload):
+    """Queue an event in the caller's transaction; it is only visible to the
+    relay once that transaction commits, and disappears with a rollback."""
+    session.add(OutboxEvent(
+        event_type=event_type,
+        aggregate_type=aggregate_type,
+        aggregate_id=aggregate_id,
+        payload=json.dumps(payload, default=json_default, separators=(',', ':'))
+    ))
+
+
+class Event:
+    __slots__ = ('id', 'event_type', 'aggregate_type', 'aggregate_id', 'payload', 'created_at')
+
+    def __init__(self, id, event_type, aggregate_type, aggregate_id, payload, created_at):
+        self.id = id
+        self.event_type = event_type
+        self.aggregate_type = aggregate_type
+        self.aggregate_id = aggregate_id
+        self.payload = payload
+        self.created_at = created_at
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'event_type': self.event_type,
+            'aggregate_type': self.aggregate_type,
+            'aggregate_id': self.aggregate_id,
+            'payload': json.loads(self.payload),
+            'created_at': self.created_at.isoformat()
+        }
+
+
+class FileSink:
+    """Appends each event as one JSON line"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def publish(self, events):
+        with open(self.path, 'a') as f:
+            f.writelines(json.dumps(event.to_dict(), separators=(',', ':')) + '\n' for event in events)
+            f.flush()
+
+
+class InProcessBus:
+    """Fans events out to callbacks in this process, e.g. cache invalidation"""
+
+    def __init__(self):
+        self._subscribers = []
+
+    def subscribe(self, callback, event_types=None):
+        self._subscribers.append((callback, set(event_types) if event_types else None))
+
+    def publish(self, events):
+        for callback, event_types in self._subscribers:
+            for event in events:
+                if event_types is None or event.event_type in event_types:
+                    callback(event)
+
+
+class RelayMetrics:
+
+    def __init__(self, window=60):
+        self.delivered = 0
+        self.batches = 0
+        self.lag_events = 0
+        self.lag_seconds = 0.0
+        self._recent = deque()
+        self._window = window
+
+    def record_batch(self, count, now):
+        self.delivered += count
+        self.batches += 1
+        self._recent.append((now, count))
+        while self._recent and now - self._recent[0][0] > self._window:
+            self._recent.popleft()
+
+    @property
+    def throughput(self):
+        """Events per second over the recent window"""
+        if len(self._recent) < 2:
+            return 0.0
+        span = self._recent[-1][0] - self._recent[0][0]
+        return sum(count for _, count in self._recent) / span if span > 0 else 0.0
+
+    def to_dict(self):
+        return {
+            'delivered': self.delivered,
+            'batches': self.batches,
+            'throughput': self.throughput,
+            'lag_events': self.lag_events,
+            'lag_seconds': self.lag_seconds
+        }
+
+
+class OutboxRelay:
+    """Delivers committed outbox events to sinks in id order, at least once.
+
+    The relay's high-water mark is stored in ``outbox_offsets`` and only
+    advanced after every sink accepted the batch. While behind, batches are
+    read back to back; the poll interval only applies once caught up, which
+    keeps lag bounded by sink throughput rather than by the poll rate.
+
+    Ids missing below the high-water mark are kept in ``outbox_gaps`` for
+    ``gap_window`` seconds, and an event that commits late under one of
+    them is delivered then, after events with higher ids.
+    """
+
+    def __init__(self, engine, sinks, name='default', batch_size=500, poll_interval=1.0, max_lag_seconds=30.0,
+                 gap_timeout=5.0, gap_window=600.0):
+        self.engine = engine
+        self.sinks = list(sinks)
+        self.name = name
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self.max_lag_seconds = max_lag_seconds
+        self.gap_timeout = gap_timeout
+        self.gap_window = gap_window
+        self.metrics = RelayMetrics()
+        self._stop = threading.Event()
+
+    def high_water_mark(self, conn):
+        """The relay's offset, locked until ``conn`` commits so that a second
+        instance of the same relay waits instead of delivering the batch too"""
+        last = conn.execute(
+            select(OutboxOffset.last_event_id).where(OutboxOffset.relay == self.name).with_for_update()
+        ).scalar()
+        if last is None:
+            conn.execute(OutboxOffset.__table__.insert().values(relay=self.name, last_event_id=0))
+            return 0
+        return last
+
+    def run_once(self):
+        """Deliver one batch; returns the number of events delivered"""
+        table = OutboxEvent.__table__
+        with self.engine.begin() as conn:
+            last_id = self.high_water_mark(conn)
+            late = self._late_events(conn)
+            rows = conn.execute(
+                select(table).where(table.c.id > last_id).order_by(table.c.id).limit(self.batch_size)
+            ).all()
+            events = self._contiguous(conn, rows, last_id)
+            if late or events:
+                self.deliver(conn, late + events)
+            if events:
+                last_id = events[-1].id
+                conn.execute(
+                    OutboxOffset.__table__.update().where(OutboxOffset.relay == self.name).values(last_event_id=last_id)
+                )
+            self._update_lag(conn, last_id)
+
+        if late or events:
+            self.metrics.record_batch(len(late) + len(events), time.monotonic())
+        return len(late) + len(events)
+
+    def deliver(self, conn, events):
+        """Hand a batch to the sinks. Subclasses that write to the same
+        database can use ``conn`` to commit with the high-water mark."""
+        for sink in self.sinks:
+            sink.publish(events)
+
+    def _contiguous(self, conn, rows, last_id):
+        # Ids are allocated before commit, so a lower id can become visible
+        # after a higher one. Stop at a gap until it is older than gap_timeout,
+        # then move past it, remembering the missing ids in case they belong
+        # to a slow transaction rather than a rolled-back one.
+        settled = datetime.utcnow() - timedelta(seconds=self.gap_timeout)
+        events = []
+        skipped = []
+        expected = last_id + 1
+        for row in rows:
+            event = Event(*row)
+            if event.id != expected:
+                if event.created_at > settled:
+                    break
+                skipped.extend(range(expected, event.id))
+            events.append(event)
+            expected = event.id + 1
+        if skipped:
+            conn.execute(OutboxGap.__table__.insert(), [
+                {'relay': self.name, 'event_id': event_id, 'skipped_at': datetime.utcnow()} for event_id in skipped
+            ])
+        return events
+
+    def _late_events(self, conn):
+        """Events that have committed under ids skipped as gaps. Gaps older
+        than ``gap_window`` are given up as rolled back."""
+        table = OutboxEvent.__table__
+        gaps = OutboxGap.__table__
+        mine = gaps.c.relay == self.name
+        expired = conn.execute(
+            gaps.delete().where(mine, gaps.c.skipped_at < datetime.utcnow() - timedelta(seconds=self.gap_window))
+        ).rowcount
+        if expired:
+            logger.info(f"Outbox relay {self.name} gave up on {expired} missing event ids")
+        gap_ids = select(gaps.c.event_id).where(mine)
+        rows = conn.execute(
+            select(table).where(table.c.id.in_(gap_ids)).order_by(table.c.id).limit(self.batch_size)
+        ).all()
+        if rows:
+            conn.execute(gaps.delete().where(mine, gaps.c.event_id.in_([row.id for row in rows])))
+        return [Event(*row) for row in rows]
+
+    def _update_lag(self, conn, last_id):
+        table = OutboxEvent.__table__
+        pending, oldest = conn.execute(
+            select(func.count(table.c.id), func.min(table.c.created_at)).where(table.c.id > last_id)
+        ).one()
+        self.metrics.lag_events = pending
+        self.metrics.lag_seconds = max(0.0, (datetime.utcnow() - oldest).total_seconds()) if oldest else 0.0
+        if self.metrics.lag_seconds > self.max_lag_seconds:
+            logger.warning(f"Outbox relay {self.name} is {self.metrics.lag_seconds:.1f}s behind ({pending} events)")
+
+    def run_forever(self):
+        while not self._stop.is_set():
+            try:
+                delivered = self.run_once()
+            except Exception as e:
+                logger.error(f"Outbox relay {self.name} failed: {e}", exc_info=True)
+                delivered = 0
+            if delivered == 0:
+                self._stop.wait(self.poll_interval)
+
+    def stop(self):
+        self._stop.set()
+
+    def prune(self, keep_last=10000):
+        """Delete events every relay has delivered, keeping the most recent
+        ``keep_last`` below the slowest relay's high-water mark"""
+        table = OutboxEvent.__table__
+        with self.engine.begin() as conn:
+            self.high_water_mark(conn)
+            last_id = conn.execute(select(func.min(OutboxOffset.last_event_id))).scalar()
+            first_gap = conn.execute(select(func.min(OutboxGap.event_id))).scalar()
+            if first_gap is not None:
+                last_id = min(last_id, first_gap - 1)
+            return conn.execute(table.delete().where(table.c.id <= last_id - keep_last)).rowcount
+
+
+if __name__ == '__main__':
+    import sys
+    from app import create_app
+    from models import db
+
+    path = sys.argv[1] if len(sys.argv) > 1 else 'outbox_events.jsonl'
+    app = create_app()
+    with app.app_context():
+        relay = OutboxRelay(
+            db.engine, [FileSink(path)],
+            batch_size=app.config['OUTBOX_BATCH_SIZE'],
+            poll_interval=app.config['OUTBOX_POLL_INTERVAL'],
+            max_lag_seconds=app.config['OUTBOX_MAX_LAG_SECONDS']
+        )
+        relay.run_forever()
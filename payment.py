@@ -1,10 +1,18 @@
-import requests
 import logging
 import hmac
 import hashlib
 import json
+from sqlalchemy import select
 from models import db, Payment, Booking, BookingStatus, PaymentStatus, PaymentProcessingStatus
 from config import Config
+from discounts import discount_engine
+from money import round_money, to_cents, from_cents, allocate_by_weight
+from invalidation import invalidate_match, seats_changed
+from seatmap import AVAILABLE, SOLD
+from outbox import record_event
+from database import tickets_for_booking, commit_seats
+from archive import archived_payments
+from projections import payment_history, invoice, DEFAULT_PAGE_SIZE
 
 logger = logging.getLogger(__name__)
 
@@ -26,6 +34,7 @@ class PaymentProcessor:
         self.base_url = Config.PAYMENT_API_BASE_URL
     
     def process_payment(self, booking_id, payment_token):
+        import requests
         booking = Booking.query.with_for_update().get(booking_id)
         
         if not booking:
@@ -34,7 +43,7 @@ class PaymentProcessor:
         if booking.payment_status == PaymentStatus.PAID:
             return {'success': False, 'error': 'Booking already paid'}
         
-        amount = booking.total_amount
+        amount = round_money(booking.total_amount)
         
         payment = Payment(
             booking_id=booking_id,
@@ -50,7 +59,7 @@ class PaymentProcessor:
                 f"{self.base_url}/charge",
                 json={
                     'payment_token': payment_token,
-                    'amount': amount
+                    'amount': float(amount)
                 },
                 headers={'Authorization': f'Bearer {self.api_key}'},
                 timeout=30
@@ -63,10 +72,17 @@ class PaymentProcessor:
                 payment.transaction_id = result.get('transaction_id')
                 booking.payment_status = PaymentStatus.PAID
                 booking.status = BookingStatus.CONFIRMED
+                record_event(db.session, 'payment.succeeded', 'payment', payment.id,
+                             booking_id=booking.id, amount=amount, transaction_id=payment.transaction_id)
             else:
                 payment.status = PaymentProcessingStatus.FAILED
+                record_event(db.session, 'payment.failed', 'payment', payment.id,
+                             booking_id=booking.id, amount=amount)
             
+            seats = [(ticket.match_id, ticket.id) for ticket in tickets_for_booking(booking.id)]
             db.session.commit()
+            if result.get('status') == 'success':
+                seats_changed(seats, SOLD)
             
             return {
                 'success': result.get('status') == 'success',
@@ -79,15 +95,21 @@ class PaymentProcessor:
             return {'success': False, 'error': 'Payment gateway error'}
     
     def refund_payment(self, payment_id):
+        import requests
         payment = Payment.query.get(payment_id)
         
         if not payment:
+            archived = db.session.execute(
+                select(archived_payments.c.id).where(archived_payments.c.id == payment_id)
+            ).first()
+            if archived:
+                return {'success': False, 'error': 'Payment belongs to an archived match and cannot be refunded'}
             return {'success': False, 'error': 'Payment not found'}
         
         try:
             payload = {
                 'transaction_id': payment.transaction_id,
-                'amount': payment.amount
+                'amount': float(round_money(payment.amount))
             }
             signature = create_signature(payload, self.api_secret)
             response = requests.post(
@@ -103,11 +125,22 @@ class PaymentProcessor:
                 payment.status = PaymentProcessingStatus.REFUNDED
                 booking = payment.booking
                 booking.status = BookingStatus.CANCELLED
-                if booking.tickets:
-                    for ticket in booking.tickets:
+                tickets = tickets_for_booking(booking.id)
+                seats = [(ticket.match_id, ticket.id) for ticket in tickets]
+                record_event(db.session, 'payment.refunded', 'payment', payment.id,
+                             booking_id=booking.id, amount=payment.amount, transaction_id=payment.transaction_id)
+                if tickets:
+                    refunds = allocate_by_weight(to_cents(payment.amount), [to_cents(t.price) for t in tickets])
+                    for ticket, refund in zip(tickets, refunds):
+                        record_event(db.session, 'seat.released', 'ticket', ticket.id,
+                                     match_id=ticket.match_id, section=ticket.section, seat_number=ticket.seat_number,
+                                     booking_id=booking.id, refund=from_cents(refund))
                         ticket.is_available = True
                         ticket.booking_id = None
-                db.session.commit()
+                commit_seats(booking.id, [ticket.id for ticket in tickets], claim=False)
+                for match_id in {match_id for match_id, _ in seats}:
+                    invalidate_match(match_id)
+                seats_changed(seats, AVAILABLE)
                 return {'success': True, 'message': 'Refund processed'}
             
             return {'success': False, 'error': 'Refund failed'}
@@ -129,50 +162,13 @@ class PaymentProcessor:
             checksum += sum(divmod(d * 2, 10))
         return checksum % 10 == 0
     
-    def get_payment_history(self, user_id):
-        payments = db.session.query(Payment).join(Booking).filter(
-            Booking.user_id == user_id
-        ).all()
-        
-        return [{
-            'payment_id': p.id,
-            'amount': float(p.amount),
-            'status': p.status.value if hasattr(p.status, 'value') else str(p.status),
-            'transaction_id': p.transaction_id
-        } for p in payments]
+    def get_payment_history(self, user_id, page=1, per_page=DEFAULT_PAGE_SIZE):
+        return payment_history(user_id, page=page, per_page=per_page)
 
 
-def calculate_discount(original_price, discount_code):
-    import os
-    import json
-    
-    discounts_json = os.environ.get('DISCOUNT_CODES', '{"SAVE10": 10, "SAVE20": 20, "VIP50": 50}')
-    try:
-        discounts = json.loads(discounts_json)
-    except json.JSONDecodeError:
-        logger.warning("Invalid DISCOUNT_CODES format, using defaults")
-        discounts = {
-            'SAVE10': 10,
-            'SAVE20': 20,
-            'VIP50': 50
-        }
-    
-    discount_percent = discounts.get(discount_code, 0)
-    discount_amount = original_price * discount_percent / 100
-    return original_price - discount_amount
+def discounted_price_cents(price_cents, discount_code, match_id=None, section=None):
+    return discount_engine.apply(price_cents, discount_code, match_id=match_id, section=section)
 
 
 def generate_invoice(booking_id):
-    booking = Booking.query.get(booking_id)
-    if not booking:
-        return None
-        
-    payment = Payment.query.filter_by(booking_id=booking_id).first()
-    
-    return {
-        'booking_id': booking.id,
-        'amount': float(booking.total_amount),
-        'status': booking.status.value if hasattr(booking.status, 'value') else str(booking.status),
-        'payment_status': booking.payment_status.value if hasattr(booking.payment_status, 'value') else str(booking.payment_status),
-        'transaction_id': payment.transaction_id if payment else None
-    }
\ No newline at end of file
+    return invoice(booking_id)
\ No newline at end of file
@@ -0,0 +1,278 @@
+from sqlalchemy import select, func, exists
+
+from archive import archived_bookings, archived_payments, archived_tickets, live_and_archived
+from models import db, Match, Ticket, Booking, Payment
+from money import to_cents, from_cents, round_money, share_of
+from sharding import shard_router
+
+DEFAULT_PAGE_SIZE = 100
+IN_CHUNK = 500
+
+_LIVE = {
+    'matches': Match.__table__,
+    'tickets': Ticket.__table__,
+    'bookings': Booking.__table__,
+    'payments': Payment.__table__,
+}
+
+
+class Row:
+    """Lightweight read-only result row; subclasses only declare ``__slots__``"""
+    __slots__ = ()
+
+    def __init__(self, *values):
+        for name, value in zip(self.__slots__, values):
+            setattr(self, name, value)
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def __repr__(self):
+        return f"<{type(self).__name__} {self.to_dict()}>"
+
+
+class BookingHistoryRow(Row):
+    __slots__ = ('booking_id', 'match', 'seat', 'section', 'amount', 'status')
+
+
+class PaymentHistoryRow(Row):
+    __slots__ = ('payment_id', 'amount', 'status', 'transaction_id')
+
+
+class InvoiceRow(Row):
+    __slots__ = ('booking_id', 'amount', 'status', 'payment_status', 'transaction_id')
+
+
+class AdminBookingRow(Row):
+    __slots__ = ('id', 'user_id', 'ticket_ids', 'status', 'total_amount')
+
+
+class Page:
+    __slots__ = ('items', 'total', 'page', 'per_page')
+
+    def __init__(self, items, total, page, per_page):
+        self.items = items
+        self.total = total
+        self.page = page
+        self.per_page = per_page
+
+    @property
+    def pages(self):
+        return -(-self.total // self.per_page) if self.per_page else 0
+
+
+def _enum_value(value):
+    return value.value if hasattr(value, 'value') else str(value)
+
+
+def _page_args(page, per_page):
+    # As db.paginate(error_out=False): pages start at 1 and sizes below 1
+    # fall back to 20, so a negative LIMIT never reaches the database.
+    return max(page, 1), per_page if per_page >= 1 else 20
+
+
+def _offset(page, per_page):
+    return (page - 1) * per_page
+
+
+def _history_row(booking_id, match_name, seat, section, total_amount, price, price_before, price_total, status):
+    # The booking total split over its tickets in proportion to their
+    # prices, in ticket id order, so a booking's rows add up to its total.
+    amount = share_of(to_cents(total_amount), to_cents(price_before or 0), to_cents(price), to_cents(price_total or 0))
+    return BookingHistoryRow(booking_id, match_name, seat, section, from_cents(amount), _enum_value(status))
+
+
+def _sharded_booking_history(user_id, page, per_page):
+    # Bookings and matches are on the primary and tickets on the shards, so
+    # the join happens here. Bookings are walked in id order a chunk at a
+    # time; ticket counts place each chunk against the page, and ticket rows
+    # are only fetched for the bookings the page covers.
+    skip = _offset(page, per_page)
+    tickets = []
+    covered = {}
+    after = 0
+    while len(tickets) < per_page:
+        bookings = db.session.execute(
+            select(Booking.id, Booking.total_amount, Booking.status)
+            .where(Booking.user_id == user_id, Booking.id > after).order_by(Booking.id).limit(per_page)
+        ).all()
+        if not bookings:
+            break
+        after = bookings[-1][0]
+        counts = {}
+        for booking_id, count in shard_router.scatter(
+            select(Ticket.booking_id, func.count(Ticket.id))
+            .where(Ticket.booking_id.in_([booking[0] for booking in bookings])).group_by(Ticket.booking_id)
+        ):
+            counts[booking_id] = counts.get(booking_id, 0) + count
+        chunk = {}
+        needed = skip + per_page - len(tickets)
+        for booking_id, total_amount, status in bookings:
+            if needed <= 0:
+                break
+            count = counts.get(booking_id, 0)
+            needed -= count
+            if not chunk and skip >= count:
+                skip -= count
+            else:
+                chunk[booking_id] = [total_amount, status, 0]
+        if not chunk:
+            continue
+
+        for booking_id, ticket_id, match_id, seat, section, price in sorted(shard_router.scatter(
+            select(Ticket.booking_id, Ticket.id, Ticket.match_id, Ticket.seat_number, Ticket.section, Ticket.price)
+            .where(Ticket.booking_id.in_(list(chunk)))
+        )):
+            booking = chunk[booking_id]
+            before, booking[2] = booking[2], booking[2] + price
+            if skip:
+                skip -= 1
+            elif len(tickets) < per_page:
+                tickets.append((booking_id, match_id, seat, section, price, before))
+        covered.update(chunk)
+
+    names = {
+        match_id: f"{home_team} vs {away_team}"
+        for match_id, home_team, away_team in db.session.execute(
+            select(Match.id, Match.home_team, Match.away_team).where(Match.id.in_({t[1] for t in tickets}))
+        )
+    } if tickets else {}
+    rows = []
+    for booking_id, match_id, seat, section, price, before in tickets:
+        total_amount, status, price_total = covered[booking_id]
+        rows.append(_history_row(booking_id, names.get(match_id), seat, section, total_amount,
+                                 price, before, price_total, status))
+    return rows
+
+
+def _sharded_history_total(user_id):
+    booking_ids = db.session.execute(select(Booking.id).where(Booking.user_id == user_id)).scalars().all()
+    total = 0
+    for i in range(0, len(booking_ids), IN_CHUNK):
+        total += sum(count for count, in shard_router.scatter(
+            select(func.count(Ticket.id)).where(Ticket.booking_id.in_(booking_ids[i:i + IN_CHUNK]))
+        ))
+    return total
+
+
+def _has_archived(user_id):
+    # Archived bookings, or live ones spanning an archived match. Users with
+    # neither, which is nearly everyone, keep the plain live-table queries.
+    if shard_router.enabled:
+        return False
+    bookings = Booking.__table__
+    return db.session.execute(select(
+        exists().where(archived_bookings.c.user_id == user_id)
+        | exists().where(archived_tickets.c.booking_id.in_(select(bookings.c.id).where(bookings.c.user_id == user_id)))
+    )).scalar()
+
+
+def _table(name, include_archived, alias=None):
+    if include_archived:
+        return live_and_archived(name, alias)
+    table = _LIVE[name]
+    return table.alias(alias) if alias else table
+
+
+def booking_history(user_id, page=1, per_page=DEFAULT_PAGE_SIZE):
+    """A page of the user's tickets, one row per ticket, in booking order,
+    including bookings and matches that have been archived"""
+    page, per_page = _page_args(page, per_page)
+    if shard_router.enabled:
+        items = _sharded_booking_history(user_id, page, per_page)
+        return Page(items, _sharded_history_total(user_id), page, per_page)
+
+    archived = _has_archived(user_id)
+    matches, tickets, bookings = (_table(name, archived) for name in ('matches', 'tickets', 'bookings'))
+    booked, earlier = _table('tickets', archived, 'booked'), _table('tickets', archived, 'earlier')
+    price_total = select(func.sum(booked.c.price)).where(
+        booked.c.booking_id == bookings.c.id
+    ).correlate(bookings).scalar_subquery()
+    price_before = select(func.sum(earlier.c.price)).where(
+        earlier.c.booking_id == bookings.c.id, earlier.c.id < tickets.c.id
+    ).correlate(bookings, tickets).scalar_subquery()
+
+    joined = bookings.join(tickets, tickets.c.booking_id == bookings.c.id).join(matches, matches.c.id == tickets.c.match_id)
+    mine = bookings.c.user_id == user_id
+    total = db.session.execute(select(func.count()).select_from(joined).where(mine)).scalar_one()
+    rows = db.session.execute(
+        select(
+            bookings.c.id, matches.c.home_team, matches.c.away_team, tickets.c.seat_number, tickets.c.section,
+            bookings.c.total_amount, tickets.c.price, price_before, price_total, bookings.c.status
+        ).select_from(joined
+        ).where(mine
+        ).order_by(bookings.c.id, tickets.c.id
+        ).limit(per_page).offset(_offset(page, per_page))
+    )
+
+    items = [
+        _history_row(booking_id, f"{home_team} vs {away_team}", seat, section, *amounts)
+        for booking_id, home_team, away_team, seat, section, *amounts in rows
+    ]
+    return Page(items, total, page, per_page)
+
+
+def payment_history(user_id, page=1, per_page=DEFAULT_PAGE_SIZE):
+    page, per_page = _page_args(page, per_page)
+    archived = _has_archived(user_id)
+    payments, bookings = _table('payments', archived), _table('bookings', archived)
+    rows = db.session.execute(
+        select(payments.c.id, payments.c.amount, payments.c.status, payments.c.transaction_id
+        ).join(bookings, bookings.c.id == payments.c.booking_id
+        ).where(bookings.c.user_id == user_id
+        ).order_by(payments.c.id
+        ).limit(per_page).offset(_offset(page, per_page))
+    )
+    return [
+        PaymentHistoryRow(payment_id, round_money(amount), _enum_value(status), transaction_id)
+        for payment_id, amount, status, transaction_id in rows
+    ]
+
+
+def _invoice_row(bookings, payments, booking_id):
+    return db.session.execute(
+        select(bookings.c.id, bookings.c.total_amount, bookings.c.status, bookings.c.payment_status,
+               payments.c.transaction_id, bookings.c.user_id
+        ).outerjoin(payments, payments.c.booking_id == bookings.c.id
+        ).where(bookings.c.id == booking_id
+        ).order_by(payments.c.id
+        ).limit(1)
+    ).first()
+
+
+def invoice(booking_id):
+    """``(owner user id, InvoiceRow)`` for a booking, live or archived, or
+    None if there is no such booking"""
+    row = _invoice_row(Booking.__table__, Payment.__table__, booking_id)
+    if row is None:
+        row = _invoice_row(archived_bookings, archived_payments, booking_id)
+    if row is None:
+        return None
+    return row[5], InvoiceRow(row[0], round_money(row[1]), _enum_value(row[2]), _enum_value(row[3]), row[4])
+
+
+def admin_bookings(status, page=1, per_page=DEFAULT_PAGE_SIZE):
+    page, per_page = _page_args(page, per_page)
+    total = db.session.execute(
+        select(func.count(Booking.id)).where(Booking.status == status)
+    ).scalar_one()
+
+    bookings = db.session.execute(
+        select(Booking.id, Booking.user_id, Booking.status, Booking.total_amount
+        ).where(Booking.status == status
+        ).order_by(Booking.id
+        ).limit(per_page).offset(_offset(page, per_page))
+    ).all()
+
+    ticket_ids = {}
+    if bookings:
+        for booking_id, ticket_id in sorted(shard_router.scatter(
+            select(Ticket.booking_id, Ticket.id).where(Ticket.booking_id.in_([b[0] for b in bookings]))
+        ), key=lambda row: row[1]):
+            ticket_ids.setdefault(booking_id, []).append(ticket_id)
+
+    items = [
+        AdminBookingRow(booking_id, user_id, ticket_ids.get(booking_id, []), _enum_value(status), round_money(total_amount))
+        for booking_id, user_id, status, total_amount in bookings
+    ]
+    return Page(items, total, page, per_page)
@@ -0,0 +1,53 @@
+"""Statements behind the public browse endpoints, shared by the Flask
+blueprint and the async catalogue app so both serve the same rows."""
+import math
+
+from sqlalchemy import func, or_, select
+
+from models import Match, Ticket
+
+MAX_PER_PAGE = 100
+
+
+def match(match_id):
+    return select(Match).where(Match.id == match_id)
+
+
+def matches():
+    return select(Match).order_by(Match.id)
+
+
+def search_matches(term):
+    pattern = f"%{term}%"
+    return select(Match).where(or_(Match.home_team.like(pattern), Match.away_team.like(pattern)))
+
+
+def available_count(match_id):
+    return select(func.count(Ticket.id)).where(Ticket.match_id == match_id, Ticket.is_available == True)
+
+
+def available_counts(match_ids):
+    """``(match_id, available)`` rows for matches on one inventory shard"""
+    return (
+        select(Ticket.match_id, func.count(Ticket.id))
+        .where(Ticket.match_id.in_(match_ids), Ticket.is_available == True)
+        .group_by(Ticket.match_id)
+    )
+
+
+def available_tickets(match_id):
+    # Ordered the way ix_tickets_match_available is, so pages are stable
+    # and need no sort.
+    return (
+        select(Ticket)
+        .where(Ticket.match_id == match_id, Ticket.is_available == True)
+        .order_by(Ticket.section, Ticket.seat_number)
+    )
+
+
+def count(statement):
+    return select(func.count()).select_from(statement.order_by(None).subquery())
+
+
+def page_count(total, per_page):
+    return math.ceil(total / per_page) if total else 0
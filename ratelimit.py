@@ -0,0 +1,216 @@
+import json
+import logging
+import math
+import os
+import sqlite3
+import threading
+import time
+from functools import wraps
+
+from flask import request, jsonify, make_response, current_app
+
+logger = logging.getLogger(__name__)
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+
+
+def parse_limit(spec):
+    """Parse ``"20/minute"`` into ``(capacity, refill rate per second)``"""
+    count, _, period = spec.partition('/')
+    capacity = int(count)
+    return capacity, capacity / PERIODS[period.strip().rstrip('s')]
+
+
+def _refill(tokens, updated, capacity, rate, now):
+    return min(capacity, tokens + (now - updated) * rate)
+
+
+class MemoryBackend:
+    """Token buckets held in this process only.
+
+    Buckets are kept least recently used first, each with the time it will
+    be full again; forgetting a bucket after that changes nothing. Pruning
+    drops such buckets from the front on every hit, and past ``max_keys``
+    also evicts the least recently used one.
+    """
+
+    def __init__(self, max_keys=100000):
+        self.max_keys = max_keys
+        self._buckets = {}
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate, now):
+        with self._lock:
+            bucket = self._buckets.pop(key, None)
+            tokens = capacity if bucket is None else _refill(bucket[0], bucket[1], capacity, rate, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            self._buckets[key] = (tokens, now, now + (capacity - tokens) / rate)
+            self._prune(now)
+            return allowed, tokens
+
+    def _prune(self, now):
+        buckets = self._buckets
+        while buckets:
+            oldest = next(iter(buckets))
+            if buckets[oldest][2] > now and len(buckets) <= self.max_keys:
+                break
+            del buckets[oldest]
+
+
+class SQLiteBackend:
+    """Buckets shared by every process on the host through a SQLite file.
+
+    A local stand-in for the Redis backend in tests and single-node setups.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._local = threading.local()
+        with self._connect() as conn:
+            conn.execute('CREATE TABLE IF NOT EXISTS rate_limit_buckets '
+                         '(key TEXT PRIMARY KEY, tokens REAL NOT NULL, updated REAL NOT NULL)')
+
+    def _connect(self):
+        # SQLite connections must not be used across fork, and the forking
+        # thread's local survives into the child.
+        conn = getattr(self._local, 'conn', None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=5, isolation_level=None)
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def take(self, key, capacity, rate, now):
+        conn = self._connect()
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            row = conn.execute('SELECT tokens, updated FROM rate_limit_buckets WHERE key = ?', (key,)).fetchone()
+            tokens = _refill(*(row or (capacity, now)), capacity, rate, now)
+            allowed = tokens >= 1
+            if allowed:
+                tokens -= 1
+            conn.execute('INSERT OR REPLACE INTO rate_limit_buckets (key, tokens, updated) VALUES (?, ?, ?)',
+                         (key, tokens, now))
+            conn.execute('COMMIT')
+        except Exception:
+            conn.execute('ROLLBACK')
+            raise
+        return allowed, tokens
+
+
+class RedisBackend:
+    """Buckets shared across nodes; needs the optional ``redis`` package"""
+
+    SCRIPT = """
+    local bucket = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+    local capacity, rate, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3])
+    local tokens = tonumber(bucket[1]) or capacity
+    local updated = tonumber(bucket[2]) or now
+    tokens = math.min(capacity, tokens + (now - updated) * rate)
+    local allowed = 0
+    if tokens >= 1 then
+        tokens = tokens - 1
+        allowed = 1
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+    redis.call('EXPIRE', KEYS[1], math.ceil(capacity / rate) + 1)
+    return {allowed, tostring(tokens)}
+    """
+
+    def __init__(self, url):
+        import redis
+        self._script = redis.Redis.from_url(url).register_script(self.SCRIPT)
+
+    def take(self, key, capacity, rate, now):
+        allowed, tokens = self._script(keys=[f'ratelimit:{key}'], args=[capacity, rate, now])
+        return bool(allowed), float(tokens)
+
+
+def create_backend(url):
+    if not url:
+        return MemoryBackend()
+    if url.startswith('redis://') or url.startswith('rediss://'):
+        return RedisBackend(url)
+    if url.startswith('sqlite:///'):
+        return SQLiteBackend(url[len('sqlite:///'):])
+    raise ValueError(f"Unsupported RATELIMIT_STORAGE_URL: {url}")
+
+
+def client_key(authorization, remote_addr, secret):
+    """Rate limit key: the user id from a valid bearer token, else the address"""
+    token = authorization or ''
+    if token.startswith('Bearer '):
+        token = token[7:]
+    if token and secret:
+        import jwt
+        try:
+            data = jwt.decode(token, secret, algorithms=['HS256'])
+            return f"user:{data['user_id']}"
+        except (jwt.InvalidTokenError, KeyError):
+            pass
+    return f"ip:{remote_addr}"
+
+
+def _client_key():
+    return client_key(request.headers.get('Authorization'), request.remote_addr, current_app.config['SECRET_KEY'])
+
+
+class RateLimiter:
+
+    def __init__(self):
+        self.enabled = True
+        self.limits = {}
+        self.backend = MemoryBackend()
+
+    def init_app(self, app):
+        self.configure(app.config)
+        app.extensions['rate_limiter'] = self
+
+    def configure(self, config):
+        self.enabled = config.get('RATELIMIT_ENABLED', True)
+        limits = dict(config.get('RATE_LIMITS', {}))
+        overrides = config.get('RATE_LIMITS_OVERRIDE')
+        if overrides:
+            try:
+                limits.update(json.loads(overrides))
+            except ValueError:
+                logger.warning("Invalid RATE_LIMITS_OVERRIDE format, using defaults")
+        self.limits = {name: parse_limit(spec) for name, spec in limits.items()}
+        self.backend = create_backend(config.get('RATELIMIT_STORAGE_URL'))
+
+    def hit(self, name, key, now=None):
+        """Take a token for ``key`` under the ``name`` limit.
+
+        Returns ``(allowed, headers)``; headers follow the ``X-RateLimit-*`` convention.
+        """
+        capacity, rate = self.limits[name]
+        allowed, tokens = self.backend.take(f'{name}:{key}', capacity, rate, now or time.time())
+        headers = {
+            'X-RateLimit-Limit': str(capacity),
+            'X-RateLimit-Remaining': str(int(tokens)),
+            'X-RateLimit-Reset': str(math.ceil((capacity - tokens) / rate)),
+        }
+        if not allowed:
+            headers['Retry-After'] = str(math.ceil((1 - tokens) / rate))
+        return allowed, headers
+
+    def limit(self, name):
+        def decorator(f):
+            @wraps(f)
+            def decorated(*args, **kwargs):
+                if not self.enabled or name not in self.limits:
+                    return f(*args, **kwargs)
+                allowed, headers = self.hit(name, _client_key())
+                if not allowed:
+                    response = make_response(jsonify({'error': 'Rate limit exceeded'}), 429)
+                else:
+                    response = make_response(f(*args, **kwargs))
+                response.headers.update(headers)
+                return response
+            return decorated
+        return decorator
+
+
+limiter = RateLimiter()
@@ -0,0 +1,171 @@
+import itertools
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from flask_sqlalchemy.session import Session
+from sqlalchemy import event, text
+
+from sharding import shard_router
+
+logger = logging.getLogger(__name__)
+
+_read_only = ContextVar('read_only', default=False)
+
+
+def probe_replica_lag(engine):
+    """Return replication lag in seconds, or None if the replica is not replicating"""
+    if engine.dialect.name != 'mysql':
+        return 0.0
+    with engine.connect() as conn:
+        try:
+            row = conn.execute(text('SHOW REPLICA STATUS')).mappings().first()
+        except Exception:
+            row = conn.execute(text('SHOW SLAVE STATUS')).mappings().first()
+    if row is None:
+        return None
+    lag = row.get('Seconds_Behind_Source', row.get('Seconds_Behind_Master'))
+    return float(lag) if lag is not None else None
+
+
+class ReplicaRouter:
+
+    def __init__(self, lag_probe=probe_replica_lag):
+        self.lag_probe = lag_probe
+        self.bind_keys = []
+        self.max_lag = 5.0
+        self.check_interval = 10.0
+        self._lag = {}
+        self._checked_at = {}
+        self._probing = {}
+        self._counter = itertools.count()
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.bind_keys = list(app.config.get('REPLICA_BIND_KEYS', []))
+        self.max_lag = app.config.get('REPLICA_MAX_LAG_SECONDS', self.max_lag)
+        self.check_interval = app.config.get('REPLICA_LAG_CHECK_INTERVAL', self.check_interval)
+        self._lag.clear()
+        self._checked_at.clear()
+        self._probing.clear()
+        app.extensions['replica_router'] = self
+
+    def record_lag(self, bind_key, lag):
+        with self._lock:
+            self._lag[bind_key] = float('inf') if lag is None else lag
+            self._checked_at[bind_key] = time.monotonic()
+
+    def _due(self, bind_key):
+        checked_at = self._checked_at.get(bind_key)
+        return checked_at is None or time.monotonic() - checked_at >= self.check_interval
+
+    def lag(self, bind_key, engine):
+        if self._due(bind_key):
+            with self._lock:
+                probing = self._probing.setdefault(bind_key, threading.Lock())
+            # One thread probes each replica; the others keep the last reading
+            # meanwhile, and only wait when there is none yet.
+            if probing.acquire(blocking=bind_key not in self._lag):
+                try:
+                    if self._due(bind_key):
+                        try:
+                            lag = self.lag_probe(engine)
+                        except Exception as e:
+                            logger.warning(f"Replica lag check failed for {bind_key}: {e}")
+                            lag = None
+                        self.record_lag(bind_key, lag)
+                finally:
+                    probing.release()
+        return self._lag[bind_key]
+
+    def status(self):
+        return {key: self._lag.get(key) for key in self.bind_keys}
+
+    def choose(self, engines):
+        healthy = [
+            key for key in self.bind_keys
+            if key in engines and self.lag(key, engines[key]) <= self.max_lag
+        ]
+        if not healthy:
+            return None
+        return engines[healthy[next(self._counter) % len(healthy)]]
+
+
+replica_router = ReplicaRouter()
+
+
+def _is_plain_read(clause):
+    if clause is None:
+        return True
+    if not getattr(clause, 'is_select', False):
+        return False
+    return getattr(clause, '_for_update_arg', None) is None
+
+
+class RoutingSession(Session):
+    """Session that sends reads issued under ``read_only`` to a healthy replica.
+
+    Writes, flushes and ``FOR UPDATE`` reads always go to the primary, as does
+    everything once the session holds pending changes or has flushed any, so
+    a request reads its own writes. When seat inventory is sharded, ticket statements go to the
+    owning shard instead, and flushes pick a connection per ticket.
+    """
+
+    def __init__(self, db, **kwargs):
+        super().__init__(db, **kwargs)
+        self.has_written = False
+        if shard_router.enabled:
+            self.connection_callable = self._connection_for_instance
+
+    def _connection_for_instance(self, mapper=None, instance=None):
+        return self.connection(bind_arguments={'mapper': mapper, 'instance': instance})
+
+    def get_bind(self, mapper=None, clause=None, bind=None, instance=None, **kwargs):
+        if bind is None and shard_router.routes(mapper, clause):
+            return shard_router.engine_for(self._db.engines, instance)
+        engine = super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+        if not _read_only.get() or bind is not None:
+            return engine
+
+        engines = self._db.engines
+        if engine is not engines.get(None):
+            return engine
+        if self._flushing or self.has_written or self.new or self.dirty or self.deleted or not _is_plain_read(clause):
+            return engine
+
+        replica = replica_router.choose(engines)
+        return replica if replica is not None else engine
+
+
+@event.listens_for(RoutingSession, 'after_flush')
+def _mark_written(session, flush_context):
+    session.has_written = True
+
+
+@event.listens_for(RoutingSession, 'do_orm_execute')
+def _route_refresh(orm_execute_state):
+    # Reloading an expired ticket has to go back to the shard it came from.
+    if shard_router.enabled and orm_execute_state.is_select:
+        refresh_state = orm_execute_state.load_options._refresh_state
+        if refresh_state is not None:
+            orm_execute_state.bind_arguments['instance'] = refresh_state.obj()
+
+
+@contextmanager
+def use_replica():
+    token = _read_only.set(True)
+    try:
+        yield
+    finally:
+        _read_only.reset(token)
+
+
+def read_only(f):
+    @wraps(f)
+    def decorated(*args, **kwargs):
+        with use_replica():
+            return f(*args, **kwargs)
+    return decorated
@@ -0,0 +1,176 @@
+import json
+import logging
+import sys
+from collections import defaultdict
+from datetime import timedelta
+
+from sqlalchemy import select, func
+
+from models import SalesRollup, OutboxEvent, OutboxGap
+from money import to_cents, from_cents
+from outbox import Event, OutboxRelay
+from replicas import read_only
+
+logger = logging.getLogger(__name__)
+
+MEASURES = ('tickets_sold', 'tickets_refunded', 'gross_cents', 'fees_cents', 'discounts_cents', 'refunds_cents')
+GRANULARITIES = ('hour', 'day')
+GROUP_BY = ('match', 'section')
+
+
+def hour_bucket(moment):
+    return moment.replace(minute=0, second=0, microsecond=0)
+
+
+def aggregate(events):
+    """Fold a batch of outbox events into ``{(hour, match_id, section): [measures]}``"""
+    totals = defaultdict(lambda: [0] * len(MEASURES))
+    for event in events:
+        if event.event_type not in ('seat.booked', 'seat.released'):
+            continue
+        payload = json.loads(event.payload)
+        row = totals[(hour_bucket(event.created_at), payload['match_id'], payload['section'])]
+        if event.event_type == 'seat.booked':
+            row[0] += 1
+            row[2] += to_cents(payload.get('price', 0))
+            row[3] += to_cents(payload.get('fee', 0))
+            row[4] += to_cents(payload.get('discount', 0))
+        else:
+            row[1] += 1
+            row[5] += to_cents(payload.get('refund', 0))
+    return totals
+
+
+def apply_totals(conn, totals):
+    table = SalesRollup.__table__
+    for (bucket_start, match_id, section), values in totals.items():
+        key = (table.c.bucket_start == bucket_start, table.c.match_id == match_id, table.c.section == section)
+        updated = conn.execute(
+            table.update().where(*key).values({name: table.c[name] + value for name, value in zip(MEASURES, values)})
+        ).rowcount
+        if not updated:
+            conn.execute(table.insert().values(
+                bucket_start=bucket_start, match_id=match_id, section=section, **dict(zip(MEASURES, values))
+            ))
+
+
+class SalesRollupJob(OutboxRelay):
+    """Keeps ``sales_rollups`` up to date from the outbox.
+
+    Rollup increments and the job's high-water mark commit in the same
+    transaction, with the offset row locked, so every seat event is counted
+    exactly once even with more than one job running.
+    """
+
+    def __init__(self, engine, batch_size=2000, poll_interval=5.0, max_lag_seconds=300.0):
+        super().__init__(engine, [], name='sales_rollup', batch_size=batch_size,
+                         poll_interval=poll_interval, max_lag_seconds=max_lag_seconds)
+
+    def deliver(self, conn, events):
+        apply_totals(conn, aggregate(events))
+
+    def rebuild(self, since=None, batch_size=20000):
+        """Recompute the buckets from ``since`` on from the events the job
+        has already applied; returns the number of events replayed.
+
+        ``prune`` drops events, so only buckets whose events are all still
+        retained can be recomputed. By default that is every bucket from the
+        hour after the oldest retained event; earlier buckets are left as
+        they are.
+        """
+        table = OutboxEvent.__table__
+        gaps = OutboxGap.__table__
+        with self.engine.begin() as conn:
+            # Holding the offset row keeps the job from applying events
+            # while their buckets are being replaced.
+            last_id = self.high_water_mark(conn)
+            if since is None:
+                oldest = conn.execute(select(func.min(table.c.created_at))).scalar()
+                if oldest is None:
+                    return 0
+                since = hour_bucket(oldest) + timedelta(hours=1)
+            since = hour_bucket(since)
+            conn.execute(SalesRollup.__table__.delete().where(SalesRollup.bucket_start >= since))
+
+            # Ids still listed as gaps have not been applied yet; the job
+            # picks them up if they ever commit.
+            applied = select(table).where(
+                table.c.created_at >= since, table.c.id <= last_id,
+                table.c.id.not_in(select(gaps.c.event_id).where(gaps.c.relay == self.name)),
+            ).order_by(table.c.id)
+            totals = defaultdict(lambda: [0] * len(MEASURES))
+            replayed, after = 0, 0
+            while True:
+                events = [Event(*row) for row in conn.execute(applied.where(table.c.id > after).limit(batch_size))]
+                if not events:
+                    break
+                for key, values in aggregate(events).items():
+                    row = totals[key]
+                    for i, value in enumerate(values):
+                        row[i] += value
+                replayed += len(events)
+                after = events[-1].id
+            apply_totals(conn, totals)
+        logger.info(f"Rebuilt sales rollups from {since:%Y-%m-%d %H:00} with {replayed} events")
+        return replayed
+
+
+def _bucket(moment, granularity):
+    return moment.replace(hour=0) if granularity == 'day' else moment
+
+
+@read_only
+def sales_timeseries(session, start, end, granularity='hour', match_id=None, section=None, group_by=GROUP_BY):
+    table = SalesRollup.__table__
+    start = _bucket(hour_bucket(start), granularity)
+    query = select(table).where(table.c.bucket_start >= start, table.c.bucket_start < end)
+    if match_id is not None:
+        query = query.where(table.c.match_id == match_id)
+    if section is not None:
+        query = query.where(table.c.section == section)
+
+    buckets = defaultdict(lambda: [0] * len(MEASURES))
+    for row in session.execute(query.order_by(table.c.bucket_start)):
+        key = (
+            _bucket(row.bucket_start, granularity),
+            row.match_id if 'match' in group_by else None,
+            row.section if 'section' in group_by else None,
+        )
+        totals = buckets[key]
+        for i, name in enumerate(MEASURES):
+            totals[i] += row._mapping[name]
+
+    series = []
+    for (bucket_start, bucket_match, bucket_section), values in sorted(
+        buckets.items(), key=lambda item: (item[0][0], item[0][1] or 0, item[0][2] or '')
+    ):
+        sold, refunded, gross, fees, discounts, refunds = values
+        entry = {
+            'bucket': bucket_start,
+            'tickets_sold': sold,
+            'tickets_refunded': refunded,
+            'gross': from_cents(gross),
+            'fees': from_cents(fees),
+            'discounts': from_cents(discounts),
+            'refunds': from_cents(refunds),
+            'net': from_cents(gross - discounts + fees - refunds),
+        }
+        if 'match' in group_by:
+            entry['match_id'] = bucket_match
+        if 'section' in group_by:
+            entry['section'] = bucket_section
+        series.append(entry)
+    return series
+
+
+if __name__ == '__main__':
+    from app import create_app
+    from models import db
+
+    app = create_app()
+    with app.app_context():
+        job = SalesRollupJob(db.engine)
+        if len(sys.argv) > 1 and sys.argv[1] == 'rebuild':
+            print(f"Replayed {job.rebuild()} events")
+        else:
+            job.run_forever()
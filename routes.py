@@ -1,41 +1,51 @@
-from flask import Blueprint, request, jsonify
-from models import db, Match, Ticket, Booking, BookingStatus, PaymentStatus
+from datetime import datetime, timedelta
+from flask import Blueprint, request, jsonify, abort
+from models import db, Booking, BookingStatus, PaymentStatus
 from booking_service import BookingService
-from payment import PaymentProcessor, calculate_discount, generate_invoice
+from payment import PaymentProcessor, discounted_price_cents, generate_invoice
+from discounts import discount_engine
+from ratelimit import limiter
+from outbox import record_event
+from rollups import sales_timeseries, GRANULARITIES, GROUP_BY
 from auth import token_required
-from database import search_matches, get_bookings_by_status
-from utils import calculate_service_fee
+from database import search_matches, get_ticket, commit_seats
+from utils import service_fee_cents, parse_utc
+from money import to_cents, from_cents
+from replicas import read_only
+from projections import admin_bookings
+from serializers import serialize_match, serialize_match_summary
+from invalidation import invalidate_match, reload_discounts, seats_changed
+from seatmap import seat_maps, HELD
+from sharding import shard_router, use_shard
+import queries
 
 api_bp = Blueprint('api', __name__)
 booking_service = BookingService()
 payment_processor = PaymentProcessor()
 
-MAX_PER_PAGE = 100
+MAX_PER_PAGE = queries.MAX_PER_PAGE
+
+def _available_seats(match_ids):
+    counts = {}
+    for key, ids in shard_router.group_matches(match_ids).items():
+        with use_shard(key):
+            counts.update(db.session.execute(queries.available_counts(ids)).all())
+    return counts
 
 @api_bp.route('/matches', methods=['GET'])
+@read_only
 def get_matches():
-    from sqlalchemy import func
     page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE)
     
-    matches = Match.query.paginate(page=page, per_page=per_page, error_out=False)
+    matches = db.paginate(queries.matches(), page=page, per_page=per_page, error_out=False)
+    available = _available_seats([m.id for m in matches.items])
     
     result = []
     for m in matches.items:
-        available_count = db.session.query(func.count(Ticket.id)).filter(
-            Ticket.match_id == m.id,
-            Ticket.is_available == True
-        ).scalar() or 0
-        
-        result.append({
-            'id': m.id,
-            'home_team': m.home_team,
-            'away_team': m.away_team,
-            'venue': m.venue,
-            'match_date': m.match_date.isoformat(),
-            'ticket_price': float(m.ticket_price),
-            'available_seats': available_count
-        })
+        data = serialize_match(m)
+        data['available_seats'] = available.get(m.id, 0)
+        result.append(data)
     
     return jsonify({
         'matches': result,
@@ -45,68 +55,70 @@ def get_matches():
     })
 
 @api_bp.route('/matches/search', methods=['GET'])
+@limiter.limit('search')
+@read_only
 def search():
     query = request.args.get('q', '')
     results = search_matches(query)
-    return jsonify({'results': [{
-        'id': m.id,
-        'home_team': m.home_team,
-        'away_team': m.away_team,
-        'venue': m.venue
-    } for m in results]})
+    return jsonify({'results': [serialize_match_summary(m) for m in results]})
 
 @api_bp.route('/matches/<int:match_id>', methods=['GET'])
+@read_only
 def get_match(match_id):
-    from sqlalchemy import func
-    match = Match.query.get_or_404(match_id)
-    
-    available_count = db.session.query(func.count(Ticket.id)).filter(
-        Ticket.match_id == match.id,
-        Ticket.is_available == True
-    ).scalar() or 0
-    
-    return jsonify({
-        'id': match.id,
-        'home_team': match.home_team,
-        'away_team': match.away_team,
-        'venue': match.venue,
-        'match_date': match.match_date.isoformat(),
-        'ticket_price': float(match.ticket_price),
-        'available_seats': available_count
-    })
+    data = booking_service.get_match_details(match_id)
+    if data is None:
+        abort(404)
+    return jsonify(data)
 
 @api_bp.route('/matches/<int:match_id>/tickets', methods=['GET'])
+@read_only
 def get_tickets(match_id):
     page = request.args.get('page', 1, type=int)
     per_page = min(request.args.get('per_page', 100, type=int), MAX_PER_PAGE)
-    tickets_page = Ticket.query.filter_by(match_id=match_id, is_available=True).paginate(page=page, per_page=per_page, error_out=False)
-    return jsonify({
-        'tickets': [{
-            'id': t.id,
-            'seat_number': t.seat_number,
-            'section': t.section,
-            'price': float(t.price)
-        } for t in tickets_page.items],
-        'total': tickets_page.total,
-        'pages': tickets_page.pages,
-        'current_page': page
-    })
+    return jsonify(booking_service.get_available_tickets(match_id, page, per_page))
+
+def _conditional(payload, etag):
+    response = jsonify(payload)
+    response.set_etag(etag)
+    response.headers['Cache-Control'] = 'no-cache'
+    return response.make_conditional(request)
+
+@api_bp.route('/matches/<int:match_id>/seatmap', methods=['GET'])
+def get_seat_map(match_id):
+    # Built from the primary: the map is kept current from writes after it
+    # is loaded, so it must not start out behind a lagging replica.
+    seat_map = seat_maps.get(match_id)
+    if seat_map is None:
+        abort(404)
+    return _conditional(*seat_map.snapshot())
+
+@api_bp.route('/matches/<int:match_id>/seatmap/layout', methods=['GET'])
+def get_seat_map_layout(match_id):
+    seat_map = seat_maps.get(match_id)
+    if seat_map is None:
+        abort(404)
+    return _conditional(*seat_map.layout())
 
 @api_bp.route('/book', methods=['POST'])
+@limiter.limit('book')
 @token_required
 def create_booking(current_user):
     data = request.get_json()
     
     ticket_id = data.get('ticket_id')
-    ticket = Ticket.query.with_for_update().get(ticket_id)
+    ticket = get_ticket(ticket_id, for_update=True)
     
     if not ticket or not ticket.is_available:
         return jsonify({'error': 'Ticket not available'}), 400
     
     discount_code = data.get('discount_code', '')
-    base_price = float(ticket.price)
-    discounted_price = calculate_discount(base_price, discount_code)
-    final_price = discounted_price + calculate_service_fee(discounted_price)
+    base_price = to_cents(ticket.price)
+    discounted_price = discounted_price_cents(base_price, discount_code, match_id=ticket.match_id, section=ticket.section)
+    final_price = from_cents(discounted_price + service_fee_cents(discounted_price))
+    
+    if discounted_price != base_price and not discount_engine.redeem(db.session, discount_code):
+        db.session.rollback()
+        return jsonify({'error': 'Discount code has been fully redeemed'}), 400
     
     try:
         booking = Booking(
@@ -116,22 +128,36 @@ def create_booking(current_user):
             payment_status=PaymentStatus.UNPAID
         )
         
+        db.session.add(booking)
+        db.session.flush()
+        
         ticket.booking_id = booking.id
         ticket.is_available = False
         
-        db.session.add(booking)
-        db.session.commit()
+        record_event(db.session, 'booking.created', 'booking', booking.id,
+                     user_id=current_user.id, ticket_ids=[ticket.id], match_ids=[ticket.match_id],
+                     amount=final_price, discount_code=discount_code or None)
+        record_event(db.session, 'seat.booked', 'ticket', ticket.id,
+                     match_id=ticket.match_id, section=ticket.section, seat_number=ticket.seat_number,
+                     booking_id=booking.id, price=from_cents(base_price),
+                     discount=from_cents(base_price - discounted_price),
+                     fee=from_cents(service_fee_cents(discounted_price)))
+        seats = [(ticket.match_id, ticket.id)]
+        commit_seats(booking.id, [ticket.id])
+        invalidate_match(ticket.match_id)
+        seats_changed(seats, HELD)
         
         return jsonify({
             'booking_id': booking.id,
             'amount': final_price,
-            'status': booking.status.value if hasattr(booking.status, 'value') else str(booking.status)
+            'status': booking.status
         }), 201
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': 'Booking failed'}), 500
 
 @api_bp.route('/book/bulk', methods=['POST'])
+@limiter.limit('book_bulk')
 @token_required
 def bulk_booking(current_user):
     data = request.get_json()
@@ -166,19 +192,28 @@ def process_payment(current_user):
 @api_bp.route('/bookings', methods=['GET'])
 @token_required
 def get_user_bookings(current_user):
-    history = booking_service.get_user_booking_history(current_user.id)
-    return jsonify(history)
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', MAX_PER_PAGE, type=int), MAX_PER_PAGE)
+    history = booking_service.get_user_booking_history(current_user.id, page=page, per_page=per_page)
+    # The body stays a plain list of rows; paging goes in headers.
+    response = jsonify([row.to_dict() for row in history.items])
+    response.headers['X-Total-Count'] = str(history.total)
+    response.headers['X-Total-Pages'] = str(history.pages)
+    response.headers['X-Current-Page'] = str(history.page)
+    return response
 
 @api_bp.route('/bookings/<int:booking_id>/invoice', methods=['GET'])
 @token_required
 def get_invoice(current_user, booking_id):
-    booking = Booking.query.get_or_404(booking_id)
+    found = generate_invoice(booking_id)
+    if found is None:
+        abort(404)
     
-    if booking.user_id != current_user.id and not current_user.is_admin:
+    owner_id, invoice = found
+    if owner_id != current_user.id and not current_user.is_admin:
         return jsonify({'error': 'Forbidden'}), 403
     
-    invoice = generate_invoice(booking_id)
-    return jsonify({'invoice': invoice})
+    return jsonify({'invoice': invoice.to_dict()})
 
 ALLOWED_STATUSES = ['pending', 'confirmed', 'cancelled']
 
@@ -191,29 +226,70 @@ def admin_get_bookings(current_user):
     status = request.args.get('status', 'pending')
     if status not in ALLOWED_STATUSES:
         return jsonify({'error': 'Invalid status value'}), 400
-    bookings = get_bookings_by_status(status)
-    return jsonify({'bookings': [{
-        'id': b.id,
-        'user_id': b.user_id,
-        'ticket_ids': [t.id for t in b.tickets] if b.tickets else [],
-        'status': b.status.value if hasattr(b.status, 'value') else str(b.status),
-        'total_amount': float(b.total_amount)
-    } for b in bookings]})
+    page = request.args.get('page', 1, type=int)
+    per_page = min(request.args.get('per_page', 20, type=int), MAX_PER_PAGE)
+    bookings = admin_bookings(BookingStatus(status), page=page, per_page=per_page)
+    return jsonify({
+        'bookings': [b.to_dict() for b in bookings.items],
+        'total': bookings.total,
+        'pages': bookings.pages,
+        'current_page': page
+    })
 
 @api_bp.route('/admin/reports/sales', methods=['GET'])
 @token_required
+@read_only
 def sales_report(current_user):
     if not current_user.is_admin:
         return jsonify({'error': 'Forbidden'}), 403
     report = booking_service.generate_sales_report()
     return jsonify({'report': report})
 
+@api_bp.route('/admin/reports/sales/timeseries', methods=['GET'])
+@token_required
+@read_only
+def sales_timeseries_report(current_user):
+    if not current_user.is_admin:
+        return jsonify({'error': 'Forbidden'}), 403
+    
+    granularity = request.args.get('granularity', 'hour')
+    if granularity not in GRANULARITIES:
+        return jsonify({'error': 'Invalid granularity value'}), 400
+    group_by = tuple(g for g in request.args.get('group_by', 'match,section').split(',') if g)
+    if any(g not in GROUP_BY for g in group_by):
+        return jsonify({'error': 'Invalid group_by value'}), 400
+    try:
+        end = parse_utc(request.args['to']) if 'to' in request.args else datetime.utcnow()
+        start = parse_utc(request.args['from']) if 'from' in request.args else end - timedelta(days=7)
+    except ValueError:
+        return jsonify({'error': 'Invalid date, expected ISO 8601'}), 400
+    
+    series = sales_timeseries(
+        db.session, start, end, granularity,
+        match_id=request.args.get('match_id', type=int),
+        section=request.args.get('section'),
+        group_by=group_by
+    )
+    return jsonify({'granularity': granularity, 'from': start, 'to': end, 'series': series})
+
 @api_bp.route('/admin/reports/revenue', methods=['GET'])
+@read_only
 def revenue_report():
-    total = booking_service.calculate_total_revenue()
+    include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+    total = booking_service.calculate_total_revenue(include_archived=include_archived)
     return jsonify({'total_revenue': total})
 
 @api_bp.route('/admin/stats/attendance', methods=['GET'])
+@read_only
 def attendance_stats():
-    stats = booking_service.get_match_attendance_stats()
-    return jsonify({'stats': stats})
\ No newline at end of file
+    include_archived = request.args.get('include_archived', 'false').lower() == 'true'
+    stats = booking_service.get_match_attendance_stats(include_archived=include_archived)
+    return jsonify({'stats': stats})
+
+@api_bp.route('/admin/discounts/reload', methods=['POST'])
+@token_required
+def reload_discount_codes(current_user):
+    if not current_user.is_admin:
+        return jsonify({'error': 'Forbidden'}), 403
+    reload_discounts()
+    return jsonify({'message': 'Discount codes reloaded'})
@@ -0,0 +1,247 @@
+import base64
+import hashlib
+import re
+import threading
+import time
+
+from sqlalchemy import select
+
+from models import db, Ticket, Booking, PaymentStatus
+from singleflight import SingleFlight
+from sharding import shard_router, use_match_shard
+
+AVAILABLE = 0
+HELD = 1
+SOLD = 2
+STATES = ('available', 'held', 'sold')
+
+_RUN = re.compile(rb'(.)\1*', re.S)
+
+
+def _varint(out, value):
+    while value >= 0x80:
+        out.append((value & 0x7f) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def encode_runs(states):
+    """Run-length encode seat states as ``state, varint(run length)`` pairs"""
+    out = bytearray()
+    for run in _RUN.finditer(bytes(states)):
+        out.append(run.group()[0])
+        _varint(out, run.end() - run.start())
+    return bytes(out)
+
+
+def decode_runs(data):
+    states = bytearray()
+    i = 0
+    while i < len(data):
+        state, length, shift = data[i], 0, 0
+        i += 1
+        while True:
+            byte = data[i]
+            i += 1
+            length |= (byte & 0x7f) << shift
+            shift += 7
+            if byte < 0x80:
+                break
+        states.extend(bytes([state]) * length)
+    return states
+
+
+def ticket_state(is_available, payment_status):
+    if is_available:
+        return AVAILABLE
+    if payment_status is None or payment_status == PaymentStatus.PAID:
+        return SOLD
+    return HELD
+
+
+class SectionMap:
+    __slots__ = ('name', 'seat_numbers', 'ticket_ids', 'states', '_encoded')
+
+    def __init__(self, name):
+        self.name = name
+        self.seat_numbers = []
+        self.ticket_ids = []
+        self.states = bytearray()
+        self._encoded = None
+
+    def encoded(self):
+        if self._encoded is None:
+            self._encoded = {
+                'seats': len(self.states),
+                'counts': {label: self.states.count(state) for state, label in enumerate(STATES)},
+                'runs': base64.b64encode(encode_runs(self.states)).decode('ascii'),
+            }
+        return self._encoded
+
+
+class MatchSeatMap:
+    """Seat states for one match, kept per section in seat order.
+
+    Changes are applied in place and only the touched sections are
+    re-encoded, on the next read. The snapshot's ``version`` is the same
+    content hash as its ETag, so every node reports the same version for
+    the same seat states.
+    """
+
+    def __init__(self, match_id, sections):
+        self.match_id = match_id
+        self.sections = sections
+        self._lock = threading.Lock()
+        self._index = {
+            ticket_id: (section, i)
+            for section in sections.values()
+            for i, ticket_id in enumerate(section.ticket_ids)
+        }
+        self._snapshot = None
+        self._layout = None
+
+    def apply(self, changes):
+        changed = False
+        with self._lock:
+            for ticket_id, state in changes:
+                position = self._index.get(ticket_id)
+                if position is None:
+                    continue
+                section, i = position
+                if section.states[i] != state:
+                    section.states[i] = state
+                    section._encoded = None
+                    changed = True
+            if changed:
+                self._snapshot = None
+        return changed
+
+    def snapshot(self):
+        # Encoded under the lock apply() holds, so a change cannot land
+        # between encoding a section and memoizing it.
+        with self._lock:
+            if self._snapshot is None:
+                sections = {name: section.encoded() for name, section in self.sections.items()}
+                etag = _etag(sections)
+                self._snapshot = {
+                    'match_id': self.match_id,
+                    'version': etag,
+                    'encoding': 'rle-varint',
+                    'states': STATES,
+                    'sections': sections,
+                }, etag
+            return self._snapshot
+
+    def layout(self):
+        if self._layout is None:
+            sections = {
+                name: {'seat_numbers': section.seat_numbers, 'ticket_ids': section.ticket_ids}
+                for name, section in self.sections.items()
+            }
+            self._layout = {'match_id': self.match_id, 'sections': sections}, _etag(sections)
+        return self._layout
+
+
+def _etag(sections):
+    digest = hashlib.blake2b(repr(sorted(sections.items())).encode('utf-8'), digest_size=12)
+    return digest.hexdigest()
+
+
+IN_CHUNK = 500
+
+
+def _sharded_seat_rows(match_id):
+    # Tickets live on the match's shard and bookings on the primary.
+    with use_match_shard(match_id):
+        tickets = db.session.execute(
+            select(Ticket.id, Ticket.section, Ticket.seat_number, Ticket.is_available, Ticket.booking_id
+            ).where(Ticket.match_id == match_id
+            ).order_by(Ticket.section, Ticket.seat_number, Ticket.id)
+        ).all()
+    booking_ids = sorted({row[4] for row in tickets if row[4] is not None})
+    statuses = {}
+    for i in range(0, len(booking_ids), IN_CHUNK):
+        statuses.update(db.session.execute(
+            select(Booking.id, Booking.payment_status).where(Booking.id.in_(booking_ids[i:i + IN_CHUNK]))
+        ).all())
+    return [row[:4] + (statuses.get(row[4]),) for row in tickets]
+
+
+def load_seat_map(match_id):
+    if shard_router.enabled:
+        rows = _sharded_seat_rows(match_id)
+    else:
+        rows = db.session.execute(
+            select(Ticket.id, Ticket.section, Ticket.seat_number, Ticket.is_available, Booking.payment_status
+            ).outerjoin(Booking, Booking.id == Ticket.booking_id
+            ).where(Ticket.match_id == match_id
+            ).order_by(Ticket.section, Ticket.seat_number, Ticket.id)
+        )
+    sections = {}
+    for ticket_id, section_name, seat_number, is_available, payment_status in rows:
+        section = sections.get(section_name)
+        if section is None:
+            section = sections[section_name] = SectionMap(section_name)
+        section.ticket_ids.append(ticket_id)
+        section.seat_numbers.append(seat_number)
+        section.states.append(ticket_state(is_available, payment_status))
+    if not sections:
+        return None
+    return MatchSeatMap(match_id, sections)
+
+
+class SeatMapCache:
+    """Per-match seat maps built from the database and kept current by
+    applying seat changes as they happen.
+
+    Maps are rebuilt ``ttl`` seconds after they were loaded, which bounds
+    how long a write this process never hears about (made through another
+    service, by hand, or on a worker with no invalidation bus configured)
+    can go unseen.
+    """
+
+    def __init__(self, ttl=30.0):
+        self.ttl = ttl
+        self._maps = {}
+        self._changed = set()
+        self._flight = SingleFlight()
+
+    def init_app(self, app):
+        self.ttl = app.config.get('SEATMAP_CACHE_TTL', self.ttl)
+        if not app.config.get('INVALIDATION_BUS_URL'):
+            # Other workers' writes only show up on a rebuild.
+            self.ttl = min(self.ttl, app.config.get('READ_CACHE_TTL', self.ttl))
+        self.clear()
+        app.extensions['seat_maps'] = self
+
+    def get(self, match_id):
+        entry = self._maps.get(match_id)
+        if entry is not None and entry[1] > time.monotonic():
+            return entry[0]
+        return self._flight.do(match_id, lambda: self._build(match_id))
+
+    def _build(self, match_id):
+        # A change landing while the map is being read may be missing from
+        # it; serve that map once but do not keep it.
+        self._changed.discard(match_id)
+        expires = time.monotonic() + self.ttl
+        seat_map = load_seat_map(match_id)
+        if seat_map is not None and match_id not in self._changed and self.ttl > 0:
+            self._maps[match_id] = (seat_map, expires)
+        return seat_map
+
+    def apply(self, match_id, changes):
+        self._changed.add(match_id)
+        entry = self._maps.get(match_id)
+        if entry is not None:
+            entry[0].apply(changes)
+
+    def invalidate(self, match_id):
+        self._maps.pop(match_id, None)
+
+    def clear(self):
+        self._maps.clear()
+        self._changed.clear()
+
+
+seat_maps = SeatMapCache()
@@ -1,6 +1,8 @@
 import os
 from app import create_app
 from models import db, User, Match, Ticket
+from migrations import upgrade, upgrade_shards
+from sharding import shard_router
 from werkzeug.security import generate_password_hash
 from datetime import datetime, timedelta
 
@@ -8,7 +10,8 @@ def seed_database():
     app = create_app()
     
     with app.app_context():
-        db.create_all()
+        upgrade(db.engine)
+        upgrade_shards(shard_router, db.engines)
         
         admin_password = os.environ.get('DEFAULT_ADMIN_PASSWORD')
         if not admin_password:
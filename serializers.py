@@ -0,0 +1,62 @@
+import enum
+from datetime import date, datetime
+from decimal import Decimal
+from operator import attrgetter
+
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+def json_default(obj):
+    if isinstance(obj, Decimal):
+        return float(obj)
+    if isinstance(obj, (datetime, date)):
+        return obj.isoformat()
+    if isinstance(obj, enum.Enum):
+        return obj.value
+    if hasattr(obj, 'to_dict'):
+        return obj.to_dict()
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON provider using orjson when installed, falling back to the stdlib encoder.
+
+    Both paths encode ``Decimal`` as a number, datetimes as ISO 8601 and enums
+    by value, so routes can hand model values straight to ``jsonify``.
+    """
+    default = staticmethod(json_default)
+
+    def dumps(self, obj, **kwargs):
+        if orjson is None:
+            return super().dumps(obj, **kwargs)
+        option = orjson.OPT_NON_STR_KEYS
+        if kwargs.get('sort_keys', self.sort_keys):
+            option |= orjson.OPT_SORT_KEYS
+        if kwargs.get('indent'):
+            option |= orjson.OPT_INDENT_2
+        return orjson.dumps(obj, default=json_default, option=option).decode('utf-8')
+
+
+def compile_serializer(*fields):
+    """Build a function turning an object into a dict of the given attributes.
+
+    Each field is an attribute name or a ``(key, attribute)`` pair; the
+    attribute lookups are bound once into a single ``attrgetter``.
+    """
+    keys = tuple(f[0] if isinstance(f, tuple) else f for f in fields)
+    attrs = tuple(f[1] if isinstance(f, tuple) else f for f in fields)
+    getter = attrgetter(*attrs)
+    if len(attrs) == 1:
+        key = keys[0]
+        return lambda obj: {key: getter(obj)}
+    return lambda obj: dict(zip(keys, getter(obj)))
+
+
+serialize_match = compile_serializer('id', 'home_team', 'away_team', 'venue', 'match_date', 'ticket_price')
+serialize_match_summary = compile_serializer('id', 'home_team', 'away_team', 'venue')
+serialize_ticket = compile_serializer('id', 'seat_number', 'section', 'price')
@@ -0,0 +1,157 @@
+import logging
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import current_app
+from sqlalchemy import inspect
+from sqlalchemy.sql.util import find_tables
+
+logger = logging.getLogger(__name__)
+
+INVENTORY_TABLES = frozenset({'tickets'})
+
+_shard = ContextVar('shard', default=None)
+
+
+class ShardRoutingError(RuntimeError):
+    pass
+
+
+def parse_pins(spec):
+    """Parse ``"7=shard_2,9=shard_2"`` into ``{7: 'shard_2', 9: 'shard_2'}``"""
+    pins = {}
+    for item in (spec or '').split(','):
+        if item.strip():
+            match_id, key = item.split('=', 1)
+            pins[int(match_id)] = key.strip()
+    return pins
+
+
+class ShardRouter:
+    """Places each match's seat inventory (its ``tickets`` rows) on one shard.
+
+    Matches map to shards by ``match_id`` modulo the shard count unless
+    pinned, so a marquee fixture can get a shard of its own. Shard ``i``
+    allocates ticket ids from ``i * id_span + 1``, which lets a ticket id
+    alone name its shard. Pins must be in place before a match's tickets are
+    created; moving existing tickets between shards is not supported.
+
+    A booking writes its booking row on the primary and its tickets on a
+    shard in one session, with no two-phase commit. Such sessions must be
+    committed with ``database.commit_seats``, which commits seat claims on
+    the shards before the primary and seat releases after it. A failure
+    between the commits then leaves seats held, never sold twice, and the
+    held seats are released in a new shard transaction.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.pins = {}
+        self.id_span = 10 ** 8
+
+    def init_app(self, app):
+        self.configure(app.config)
+        if self.enabled:
+            logger.info(f"Seat inventory sharded over {len(self.keys)} databases")
+        app.extensions['shard_router'] = self
+
+    def configure(self, config):
+        self.keys = list(config.get('SHARD_BIND_KEYS', []))
+        self.id_span = config.get('SHARD_ID_SPAN', self.id_span)
+        self.pins = parse_pins(config.get('SHARD_PINS'))
+        unknown = set(self.pins.values()) - set(self.keys)
+        if unknown:
+            raise ValueError(f"SHARD_PINS names unknown shards: {', '.join(sorted(unknown))}")
+
+    @property
+    def enabled(self):
+        return bool(self.keys)
+
+    def first_ticket_id(self, key):
+        return self.keys.index(key) * self.id_span + 1
+
+    def shard_for_match(self, match_id):
+        if not self.enabled or match_id is None:
+            return None
+        return self.pins.get(match_id) or self.keys[match_id % len(self.keys)]
+
+    def shard_for_ticket(self, ticket_id):
+        if not self.enabled or not isinstance(ticket_id, int) or ticket_id < 1:
+            return None
+        index = (ticket_id - 1) // self.id_span
+        return self.keys[index] if index < len(self.keys) else None
+
+    def group_matches(self, match_ids):
+        """``{shard key: [match ids]}``; everything is under ``None`` when
+        sharding is off"""
+        groups = {}
+        for match_id in match_ids:
+            groups.setdefault(self.shard_for_match(match_id), []).append(match_id)
+        return groups
+
+    def routes(self, mapper, clause):
+        """Whether a statement reads or writes the seat inventory"""
+        if not self.enabled:
+            return False
+        tables = set()
+        if mapper is not None:
+            tables.add(inspect(mapper).local_table.name)
+        if clause is not None:
+            tables.update(t.name for t in find_tables(clause, include_crud=True))
+        if not tables & INVENTORY_TABLES:
+            return False
+        if tables - INVENTORY_TABLES:
+            raise ShardRoutingError(
+                f"Seat inventory is sharded and cannot be joined with {', '.join(sorted(tables - INVENTORY_TABLES))}"
+            )
+        return True
+
+    def engine_for(self, engines, instance=None):
+        key = None
+        if instance is not None:
+            # The identity key, not instance.id, so an expired ticket is not
+            # refreshed just to find out where it lives.
+            identity = inspect(instance).identity
+            key = self.shard_for_ticket(identity[0]) if identity else self.shard_for_match(instance.match_id)
+        if key is None:
+            key = _shard.get()
+        if key is None:
+            raise ShardRoutingError("Seat inventory statement issued outside use_shard()")
+        return engines[key]
+
+    def scatter(self, statement):
+        """Run a read-only inventory ``statement`` everywhere the inventory
+        lives and return all rows; shards are queried in parallel"""
+        db = current_app.extensions['sqlalchemy']
+        if not self.enabled:
+            return db.session.execute(statement).all()
+
+        def run(engine):
+            with engine.connect() as conn:
+                return conn.execute(statement).all()
+
+        engines = [db.engines[key] for key in self.keys]
+        # A pool per call keeps this fork-safe; scatters are admin-only.
+        with ThreadPoolExecutor(max_workers=len(engines), thread_name_prefix='scatter') as pool:
+            return [row for rows in pool.map(run, engines) for row in rows]
+
+
+shard_router = ShardRouter()
+
+
+@contextmanager
+def use_shard(key):
+    token = _shard.set(key)
+    try:
+        yield
+    finally:
+        _shard.reset(token)
+
+
+def use_match_shard(match_id):
+    return use_shard(shard_router.shard_for_match(match_id))
+
+
+def use_ticket_shard(ticket_id):
+    return use_shard(shard_router.shard_for_ticket(ticket_id))
@@ -0,0 +1,132 @@
+import itertools
+import math
+import random
+import threading
+import time
+
+
+class _Call:
+    __slots__ = ('event', 'result', 'error')
+
+    def __init__(self):
+        self.event = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """Collapse concurrent calls for the same key into one execution.
+
+    The first caller runs ``fn``; callers arriving while it is in flight
+    block and receive the same result (or exception).
+    """
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def do(self, key, fn):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+
+        if not leader:
+            call.event.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = fn()
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.event.set()
+        return call.result
+
+
+class EarlyExpiryCache:
+    """Short-lived result cache refreshed ahead of expiry with probability
+    rising as expiry nears (XFetch), so a hot key is recomputed by one caller
+    instead of expiring for everyone at once. Misses go through a
+    ``SingleFlight`` so concurrent misses share one computation.
+
+    Cached values are shared between threads and must not be mutated. A
+    value whose key (or match) was invalidated while it was being computed
+    is returned to its callers but not kept.
+    """
+
+    def __init__(self, ttl=2.0, beta=1.0, max_entries=10000):
+        self.ttl = ttl
+        self.beta = beta
+        self.max_entries = max_entries
+        self._entries = {}
+        self._flight = SingleFlight()
+        self._lock = threading.Lock()
+        self._counter = itertools.count(1)
+        self._generations = {}
+        self._epoch = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('READ_CACHE_TTL', self.ttl)
+        self.beta = app.config.get('READ_CACHE_BETA', self.beta)
+        self.clear()
+        app.extensions['read_cache'] = self
+
+    def get_or_compute(self, key, fn):
+        if self.ttl <= 0:
+            return self._flight.do(key, fn)
+        entry = self._entries.get(key)
+        if entry is not None:
+            value, delta, expiry = entry
+            if time.monotonic() - delta * self.beta * math.log(1.0 - random.random()) < expiry:
+                return value
+        return self._flight.do(key, lambda: self._compute(key, fn))
+
+    def _generation(self, key):
+        return self._epoch, self._generations.get(_scope(key))
+
+    def _compute(self, key, fn):
+        generation = self._generation(key)
+        start = time.monotonic()
+        value = fn()
+        finished = time.monotonic()
+        with self._lock:
+            if self._generation(key) != generation:
+                return value
+            self._entries[key] = (value, finished - start, finished + self.ttl)
+            if len(self._entries) > self.max_entries:
+                try:
+                    del self._entries[next(iter(self._entries))]
+                except (StopIteration, KeyError, RuntimeError):
+                    pass
+        return value
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generations[_scope(key)] = next(self._counter)
+            self._entries.pop(key, None)
+
+    def invalidate_match(self, match_id):
+        with self._lock:
+            self._generations[match_id] = next(self._counter)
+            for key in [k for k in list(self._entries) if len(k) > 1 and k[1] == match_id]:
+                self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._epoch = next(self._counter)
+            self._entries.clear()
+
+
+def _scope(key):
+    # Keys are ``(kind, match_id, ...)``; invalidating a match covers them all.
+    return key[1] if isinstance(key, tuple) and len(key) > 1 else key
+
+
+read_cache = EarlyExpiryCache()
@@ -0,0 +1,97 @@
+import logging
+import time
+from datetime import datetime
+
+from flask import request
+from sqlalchemy import select, text
+
+from models import db, Match
+from seatmap import seat_maps
+from singleflight import read_cache
+
+logger = logging.getLogger(__name__)
+
+
+def prime_pools():
+    """Open a connection on the primary and every replica bind, so the first
+    requests skip connecting and dialect initialisation"""
+    for engine in db.engines.values():
+        with engine.connect() as conn:
+            conn.execute(text('SELECT 1'))
+
+
+def _dispatch(app, path):
+    # Runs the view directly: no before_request hooks, so nothing (such as
+    # the invalidation bus listener) is started in a preloading master.
+    with app.test_request_context(path):
+        return app.view_functions[request.url_rule.endpoint](**request.view_args)
+
+
+def warm_paths(match_ids):
+    # The match list is served straight from the database; the rest go
+    # through the read cache or build a seat map.
+    paths = ['/api/matches']
+    for match_id in match_ids:
+        paths += [
+            f'/api/matches/{match_id}',
+            f'/api/matches/{match_id}/tickets',
+            f'/api/matches/{match_id}/seatmap',
+        ]
+    return paths
+
+
+def warm_up(app, matches=None, caches=True):
+    """Prime connection pools, SQLAlchemy's compiled statement cache, the read
+    cache and seat maps by serving the browse endpoints for the next
+    ``matches`` upcoming matches. Failures are logged, never raised.
+
+    With ``caches=False`` only the pools and the statements behind the match
+    list are primed, for a preloading master whose cached reads and seat maps
+    would be dropped by every worker anyway."""
+    if matches is None:
+        matches = app.config.get('WARMUP_MATCHES', 20) if caches else 0
+    timings = {}
+    started = time.perf_counter()
+    with app.app_context():
+        try:
+            prime_pools()
+        except Exception as e:
+            logger.warning(f"Warm-up could not prime connection pools: {e}")
+            return timings
+        timings['pools'] = time.perf_counter() - started
+
+        try:
+            match_ids = db.session.execute(
+                select(Match.id).where(Match.match_date >= datetime.now()).order_by(Match.match_date).limit(matches)
+            ).scalars().all() if matches else []
+        except Exception as e:
+            logger.warning(f"Warm-up could not list upcoming matches: {e}")
+            db.session.remove()
+            return timings
+        for path in warm_paths(match_ids):
+            try:
+                _dispatch(app, path)
+            except Exception as e:
+                logger.warning(f"Warm-up request {path} failed: {e}")
+        db.session.remove()
+    timings['total'] = time.perf_counter() - started
+    logger.info(f"Warm-up finished in {timings['total'] * 1000:.0f}ms ({len(match_ids)} matches)")
+    return timings
+
+
+def after_fork(app, warm=True):
+    """Call in each worker after a preloading master forks.
+
+    Pooled connections opened in the master are dropped without closing them,
+    since the master still owns the sockets; the compiled statement cache is
+    kept. The master warms with ``caches=False``, so the read cache and seat
+    maps are filled here, once per worker; anything the master did cache is
+    dropped first, as invalidations sent before the fork never reach it.
+    """
+    with app.app_context():
+        for engine in db.engines.values():
+            engine.dispose(close=False)
+    read_cache.clear()
+    seat_maps.clear()
+    if warm:
+        warm_up(app)
@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta
+
+import pytest
+from flask import Flask
+
+from archive import MatchArchiver
+from booking_service import BookingService
+from models import db, User, Match, Ticket, Booking, Payment, BookingStatus, PaymentStatus, PaymentProcessingStatus
+from projections import booking_history, invoice, payment_history
+from replicas import replica_router
+from sharding import shard_router
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path}/primary.db',
+        SQLALCHEMY_BINDS={},
+        REPLICA_BIND_KEYS=[],
+        REPLICA_MAX_LAG_SECONDS=5.0,
+        REPLICA_LAG_CHECK_INTERVAL=60.0,
+        SHARD_BIND_KEYS=[],
+        SHARD_ID_SPAN=10 ** 8,
+        SHARD_PINS='',
+    )
+    db.init_app(app)
+    replica_router.init_app(app)
+    shard_router.init_app(app)
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+
+
+def book(user, match, price, amount):
+    ticket = Ticket(match_id=match.id, seat_number=f'S{price}', section='Standard', price=price, is_available=False)
+    booking = Booking(user_id=user.id, status=BookingStatus.CONFIRMED, payment_status=PaymentStatus.PAID,
+                      total_amount=amount)
+    db.session.add(booking)
+    db.session.flush()
+    ticket.booking_id = booking.id
+    db.session.add_all([ticket, Payment(booking_id=booking.id, amount=amount, payment_method='card',
+                                        transaction_id=f'tx{booking.id}', status=PaymentProcessingStatus.SUCCESS)])
+    return booking
+
+
+@pytest.fixture
+def bookings(app):
+    user = User(username='u', email='u@example.com', password='x')
+    past = Match(home_team='Old', away_team='Y', venue='V', match_date=datetime.utcnow() - timedelta(days=30),
+                 total_seats=10, ticket_price=20)
+    upcoming = Match(home_team='New', away_team='Z', venue='V', match_date=datetime.utcnow() + timedelta(days=3),
+                     total_seats=10, ticket_price=50)
+    db.session.add_all([user, past, upcoming])
+    db.session.flush()
+    archived = book(user, past, 20, 20)
+    live = book(user, upcoming, 50, 50)
+    db.session.commit()
+    return user.id, archived.id, live.id
+
+
+def test_archived_bookings_leave_live_reports_but_not_user_history(app, bookings):
+    user_id, archived_id, live_id = bookings
+    moved = MatchArchiver(db.engine).run(datetime.utcnow())
+    assert moved == {'matches': 1, 'tickets': 1, 'bookings': 1, 'payments': 1}
+    db.session.expire_all()
+    booking_service = BookingService()
+
+    assert booking_service.calculate_total_revenue() == 50
+    assert booking_service.calculate_total_revenue(include_archived=True) == 70
+    assert [row['match_name'] for row in booking_service.get_match_attendance_stats()] == ['New vs Z']
+    assert [row['booked'] for row in booking_service.get_match_attendance_stats(include_archived=True)] == [1, 1]
+
+    history = booking_history(user_id)
+    assert history.total == 2
+    assert [(row.booking_id, row.match, row.amount) for row in history.items] == \
+        [(archived_id, 'Old vs Y', 20), (live_id, 'New vs Z', 50)]
+    assert [row.transaction_id for row in payment_history(user_id)] == [f'tx{archived_id}', f'tx{live_id}']
+
+    owner, row = invoice(archived_id)
+    assert owner == user_id
+    assert (row.amount, row.payment_status, row.transaction_id) == (20, 'paid', f'tx{archived_id}')
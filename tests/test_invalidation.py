@@ -0,0 +1,117 @@
+import json
+
+import pytest
+
+from invalidation import FileTransport, InvalidationBus
+
+
+def message(seq, kind='match', key=1, node='other'):
+    return json.dumps({'node': node, 'seq': seq, 'kind': kind, 'key': key})
+
+
+@pytest.fixture
+def bus():
+    bus = InvalidationBus()
+    bus._node_id = 'self'
+    bus.received = []
+    bus.refreshes = 0
+
+    def refresh():
+        bus.refreshes += 1
+
+    bus.subscribe('match', bus.received.append)
+    bus.on_full_refresh(refresh)
+    return bus
+
+
+def test_messages_in_sequence_reach_handlers(bus):
+    for seq in (1, 2, 3):
+        bus.handle(message(seq, key=seq))
+    assert bus.received == [1, 2, 3]
+    assert bus.refreshes == 0
+
+
+def test_gap_in_sequence_triggers_full_refresh(bus):
+    bus.handle(message(1))
+    bus.handle(message(4))
+    assert bus.stats['gaps'] == 1
+    assert bus.refreshes == 1
+    bus.handle(message(5, key=5))
+    assert bus.received == [1, 5]
+
+
+def test_replayed_messages_are_ignored(bus):
+    for seq in (1, 2, 2, 1):
+        bus.handle(message(seq, key=seq))
+    assert bus.received == [1, 2]
+    assert bus.refreshes == 0
+
+
+def test_own_messages_are_ignored(bus):
+    bus.handle(message(1, node='self'))
+    assert bus.received == []
+
+
+def test_sequences_are_tracked_per_node(bus):
+    bus.handle(message(7, node='a', key='a'))
+    bus.handle(message(1, node='b', key='b'))
+    assert bus.received == ['a', 'b']
+    assert bus.refreshes == 0
+
+
+def test_file_transport_delivers_in_order(tmp_path):
+    path = str(tmp_path / 'bus.log')
+    sender, receiver = FileTransport(path), FileTransport(path)
+    for seq in range(1, 4):
+        sender.send(message(seq))
+    assert [json.loads(raw)['seq'] for raw in receiver.receive(0)] == [1, 2, 3]
+    assert receiver.receive(0) == []
+
+
+def test_file_transport_only_sees_messages_sent_after_it_opened(tmp_path):
+    path = str(tmp_path / 'bus.log')
+    sender = FileTransport(path)
+    sender.send(message(1))
+    receiver = FileTransport(path)
+    sender.send(message(2))
+    assert [json.loads(raw)['seq'] for raw in receiver.receive(0)] == [2]
+
+
+def test_file_transport_rotation_loses_nothing_unread(tmp_path):
+    path = str(tmp_path / 'bus.log')
+    sender = FileTransport(path, max_bytes=400)
+    receiver = FileTransport(path)
+    seen = []
+    for seq in range(1, 21):
+        sender.send(message(seq))
+        if seq % 3 == 0:
+            seen.extend(json.loads(raw)['seq'] for raw in receiver.receive(0))
+    seen.extend(json.loads(raw)['seq'] for raw in receiver.receive(0))
+    assert seen == list(range(1, 21))
+    assert (tmp_path / 'bus.log').stat().st_size < 400
+
+
+def test_receiver_behind_several_rotations_sees_a_gap(tmp_path, bus):
+    path = str(tmp_path / 'bus.log')
+    sender = FileTransport(path, max_bytes=200)
+    bus.transport = FileTransport(path)
+    for seq in range(1, 23):
+        sender.send(message(seq, key=seq))
+    for _ in range(3):
+        for raw in bus.transport.receive(0):
+            bus.handle(raw)
+    assert bus.stats['gaps'] == 1
+    assert bus.received[:4] == [1, 2, 3, 4]
+    assert bus.received[-1] == 22
+
+
+def test_truncated_file_resets_receiver(tmp_path):
+    path = str(tmp_path / 'bus.log')
+    sender, receiver = FileTransport(path), FileTransport(path)
+    sender.send(message(1))
+    receiver.receive(0)
+    open(path, 'w').close()
+    with pytest.raises(ConnectionResetError):
+        receiver.receive(0)
+    sender.send(message(2))
+    assert [json.loads(raw)['seq'] for raw in receiver.receive(0)] == [2]
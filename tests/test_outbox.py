@@ -0,0 +1,80 @@
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import create_engine, select
+
+from models import OutboxEvent, OutboxOffset, OutboxGap
+from outbox import OutboxRelay
+
+
+class ListSink:
+
+    def __init__(self):
+        self.ids = []
+
+    def publish(self, events):
+        self.ids.extend(event.id for event in events)
+
+
+@pytest.fixture
+def engine(tmp_path):
+    engine = create_engine(f'sqlite:///{tmp_path}/outbox.db')
+    for model in (OutboxEvent, OutboxOffset, OutboxGap):
+        model.__table__.create(engine)
+    yield engine
+    engine.dispose()
+
+
+def add_events(engine, *ids, age=60):
+    created_at = datetime.utcnow() - timedelta(seconds=age)
+    with engine.begin() as conn:
+        conn.execute(OutboxEvent.__table__.insert(), [
+            {'id': event_id, 'event_type': 'seat.booked', 'aggregate_type': 'ticket', 'aggregate_id': event_id,
+             'payload': '{}', 'created_at': created_at}
+            for event_id in ids
+        ])
+
+
+def test_recent_gap_holds_back_later_events(engine):
+    sink = ListSink()
+    relay = OutboxRelay(engine, [sink])
+    add_events(engine, 1)
+    add_events(engine, 3, age=0)
+    relay.run_once()
+    assert sink.ids == [1]
+
+
+def test_late_commit_under_skipped_id_is_delivered(engine):
+    sink = ListSink()
+    relay = OutboxRelay(engine, [sink])
+    add_events(engine, 1, 3)
+    relay.run_once()
+    assert sink.ids == [1, 3]
+
+    add_events(engine, 2)
+    assert relay.run_once() == 1
+    assert sink.ids == [1, 3, 2]
+    with engine.connect() as conn:
+        assert conn.execute(select(OutboxGap.event_id)).all() == []
+
+
+def test_gaps_are_given_up_after_window(engine):
+    relay = OutboxRelay(engine, [ListSink()], gap_window=0)
+    add_events(engine, 1, 3)
+    relay.run_once()
+    relay.run_once()
+    with engine.connect() as conn:
+        assert conn.execute(select(OutboxGap.event_id)).all() == []
+
+
+def test_prune_keeps_events_a_slower_relay_has_not_seen(engine):
+    add_events(engine, *range(1, 11))
+    fast = OutboxRelay(engine, [ListSink()])
+    slow = OutboxRelay(engine, [ListSink()], name='slow', batch_size=4)
+    fast.run_once()
+    slow.run_once()
+
+    assert fast.prune(keep_last=0) == 4
+    slow.run_once()
+    slow.run_once()
+    assert slow.metrics.delivered == 10
@@ -0,0 +1,98 @@
+import threading
+import time
+from datetime import datetime
+
+import pytest
+from flask import Flask
+
+from models import db, Match
+from replicas import probe_replica_lag, replica_router, use_replica
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path}/primary.db',
+        SQLALCHEMY_BINDS={'replica_0': f'sqlite:///{tmp_path}/replica.db'},
+        REPLICA_BIND_KEYS=['replica_0'],
+        REPLICA_MAX_LAG_SECONDS=5.0,
+        REPLICA_LAG_CHECK_INTERVAL=60.0,
+    )
+    db.init_app(app)
+    replica_router.init_app(app)
+    replica_router.lag_probe = lambda engine: 0.0
+    with app.app_context():
+        # The same row on both files, told apart by venue.
+        for key, venue in ((None, 'primary'), ('replica_0', 'replica')):
+            engine = db.engines[key]
+            Match.__table__.create(engine)
+            with engine.begin() as conn:
+                conn.execute(Match.__table__.insert().values(
+                    id=1, home_team='A', away_team='B', venue=venue,
+                    match_date=datetime(2030, 1, 1), ticket_price=10,
+                ))
+        yield app
+        db.session.remove()
+    replica_router.lag_probe = probe_replica_lag
+
+
+def venue():
+    db.session.expire_all()
+    return db.session.get(Match, 1).venue
+
+
+def test_reads_outside_read_only_use_primary(app):
+    assert venue() == 'primary'
+
+
+def test_read_only_reads_use_healthy_replica(app):
+    with use_replica():
+        assert venue() == 'replica'
+
+
+def test_lagging_replica_falls_back_to_primary(app):
+    replica_router.lag_probe = lambda engine: 30.0
+    with use_replica():
+        assert venue() == 'primary'
+
+
+def test_failed_probe_falls_back_to_primary(app):
+    def probe(engine):
+        raise RuntimeError('replica down')
+    replica_router.lag_probe = probe
+    with use_replica():
+        assert venue() == 'primary'
+    assert replica_router.status() == {'replica_0': float('inf')}
+
+
+def test_reads_after_a_write_use_primary(app):
+    with use_replica():
+        # The pending row is autoflushed before the read; the session must
+        # stay on the primary afterwards.
+        db.session.add(Match(home_team='C', away_team='D', venue='new', match_date=datetime(2030, 1, 2),
+                             ticket_price=10))
+        assert db.session.get(Match, 1).venue == 'primary'
+    db.session.rollback()
+
+
+def test_concurrent_requests_probe_once(app):
+    calls = []
+
+    def probe(engine):
+        calls.append(engine)
+        time.sleep(0.05)
+        return 0.0
+    replica_router.lag_probe = probe
+    engine = db.engines['replica_0']
+    threads = [threading.Thread(target=replica_router.lag, args=('replica_0', engine)) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(calls) == 1
+
+    replica_router.record_lag('replica_0', 0.0)
+    replica_router._checked_at['replica_0'] -= 120
+    assert replica_router.lag('replica_0', engine) == 0.0
+    assert len(calls) == 2
@@ -0,0 +1,89 @@
+from datetime import datetime
+
+import pytest
+from flask import Flask
+from sqlalchemy import event, select
+from sqlalchemy.exc import OperationalError
+
+from booking_service import BookingService
+from database import commit_seats, get_ticket
+from models import db, User, Match, Ticket, Booking, BookingStatus
+from replicas import replica_router
+from sharding import shard_router
+
+SPAN = 1000
+
+
+@pytest.fixture
+def app(tmp_path):
+    app = Flask(__name__)
+    app.config.update(
+        SQLALCHEMY_DATABASE_URI=f'sqlite:///{tmp_path}/primary.db',
+        SQLALCHEMY_BINDS={key: f'sqlite:///{tmp_path}/{key}.db' for key in ('shard_0', 'shard_1')},
+        REPLICA_BIND_KEYS=[],
+        REPLICA_MAX_LAG_SECONDS=5.0,
+        REPLICA_LAG_CHECK_INTERVAL=60.0,
+        SHARD_BIND_KEYS=['shard_0', 'shard_1'],
+        SHARD_ID_SPAN=SPAN,
+        SHARD_PINS='',
+    )
+    db.init_app(app)
+    replica_router.init_app(app)
+    shard_router.init_app(app)
+    with app.app_context():
+        db.create_all(bind_key=None)
+        db.session.add_all([
+            User(id=1, username='u', email='u@example.com', password='x'),
+            Match(id=2, home_team='A', away_team='B', venue='V', match_date=datetime(2030, 1, 1), ticket_price=10),
+        ])
+        db.session.commit()
+        for key in shard_router.keys:
+            engine = db.engines[key]
+            Ticket.__table__.create(engine)
+            with engine.begin() as conn:
+                conn.execute(Ticket.__table__.insert().values(
+                    id=shard_router.first_ticket_id(key), match_id=2, seat_number='S1', section='VIP',
+                    price=10, is_available=True,
+                ))
+        yield app
+        db.session.remove()
+    shard_router.configure({})
+
+
+def fail_next_commit(engine):
+    def fail(conn):
+        raise OperationalError('COMMIT', {}, Exception('connection lost'))
+    event.listen(engine, 'commit', fail, once=True)
+
+
+def seat(ticket_id):
+    db.session.expire_all()
+    ticket = get_ticket(ticket_id)
+    return ticket.is_available, ticket.booking_id
+
+
+def test_claim_is_released_when_the_primary_commit_fails(app):
+    ticket_ids = [1, SPAN + 1]
+    fail_next_commit(db.engines[None])
+    with pytest.raises(OperationalError):
+        BookingService().process_bulk_booking(1, ticket_ids)
+
+    assert db.session.execute(select(Booking.id)).all() == []
+    assert [seat(ticket_id) for ticket_id in ticket_ids] == [(True, None), (True, None)]
+    assert BookingService().process_bulk_booking(1, ticket_ids)['successful'] == ticket_ids
+
+
+def test_release_is_retried_when_the_shard_commit_fails(app):
+    BookingService().process_bulk_booking(1, [1])
+    booking = db.session.get(Booking, 1)
+    booking.status = BookingStatus.CANCELLED
+    ticket = get_ticket(1)
+    ticket.is_available, ticket.booking_id = True, None
+
+    fail_next_commit(db.engines['shard_0'])
+    with pytest.raises(OperationalError):
+        commit_seats(1, [1], claim=False)
+
+    db.session.expire_all()
+    assert db.session.get(Booking, 1).status == BookingStatus.CANCELLED
+    assert seat(1) == (True, None)
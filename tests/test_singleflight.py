@@ -0,0 +1,43 @@
+from singleflight import EarlyExpiryCache
+
+
+def test_values_are_cached():
+    cache = EarlyExpiryCache(ttl=60)
+    loads = []
+    for _ in range(3):
+        cache.get_or_compute(('match', 1), lambda: loads.append(1) or 10)
+    assert len(loads) == 1
+
+
+def test_invalidation_during_load_is_not_overwritten():
+    cache = EarlyExpiryCache(ttl=60)
+
+    def load():
+        # A booking commits and invalidates the match while this read runs.
+        cache.invalidate_match(1)
+        return 10
+
+    assert cache.get_or_compute(('tickets', 1, 1, 100), load) == 10
+    assert cache.get_or_compute(('tickets', 1, 1, 100), lambda: 9) == 9
+
+
+def test_other_matches_are_stored_during_an_invalidation():
+    cache = EarlyExpiryCache(ttl=60)
+
+    def load():
+        cache.invalidate_match(2)
+        return 10
+
+    cache.get_or_compute(('match', 1), load)
+    assert cache.get_or_compute(('match', 1), lambda: 9) == 10
+
+
+def test_clear_during_load_is_not_overwritten():
+    cache = EarlyExpiryCache(ttl=60)
+
+    def load():
+        cache.clear()
+        return 10
+
+    cache.get_or_compute(('match', 1), load)
+    assert cache.get_or_compute(('match', 1), lambda: 9) == 9
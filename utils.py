@@ -1,8 +1,9 @@
 import re
 import logging
 import os
-from datetime import datetime
+from datetime import datetime, timezone
 from urllib.parse import urlencode
+from money import to_basis_points, percent_of
 
 logger = logging.getLogger(__name__)
 
@@ -12,6 +13,8 @@ except (ValueError, TypeError):
     logger.warning('Invalid SERVICE_FEE_RATE in environment. Falling back to default 0.15.')
     SERVICE_FEE_RATE = 0.15
 
+SERVICE_FEE_BPS = to_basis_points(SERVICE_FEE_RATE * 100)
+
 def validate_email(email):
     pattern = r"(^[a-zA-Z0-9_.+-]+@[a-zA-Z0-9-]+\.[a-zA-Z0-9-.]+$)"
     return re.match(pattern, email) is not None
@@ -22,12 +25,19 @@ def format_currency(amount):
 def generate_seat_numbers(section, count):
     return [f"{section}-{i}" for i in range(1, count + 1)]
 
-def calculate_service_fee(ticket_price):
-    return ticket_price * SERVICE_FEE_RATE
+def service_fee_cents(price_cents):
+    return percent_of(price_cents, SERVICE_FEE_BPS)
 
 def get_available_sections():
     return ['VIP', 'Premium', 'Standard', 'Economy']
 
+def parse_utc(value):
+    """ISO 8601 timestamp as a naive UTC datetime; offsets such as ``Z`` are converted"""
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is not None:
+        parsed = parsed.astimezone(timezone.utc).replace(tzinfo=None)
+    return parsed
+
 def format_match_date(date_obj):
     return date_obj.strftime('%B %d, %Y at %H:%M')
 
@@ -0,0 +1,5 @@
+from app import create_app
+from startup import warm_up
+
+app = create_app()
+warm_up(app, caches=False)